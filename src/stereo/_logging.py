@@ -1,3 +1,4 @@
+import atexit
 import logging.config
 from pathlib import Path
 
@@ -34,12 +35,23 @@ def setup_logger(verbosity: int, app_dir: Path):
                 "maxBytes": 10485760,  # 10MB
                 "backupCount": 3,
                 "encoding": "utf8",
+                "delay": True,
+            },
+            # file writes (and rollovers) happen on the listener's thread
+            "queue": {
+                "class": "logging.handlers.QueueHandler",
+                "handlers": ["file"],
+                "respect_handler_level": True,
             },
         },
         "root": {
-            "handlers": ["console", "file"],
+            "handlers": ["console", "queue"],
             "level": level,
         },
     }
 
     logging.config.dictConfig(config)
+
+    listener = logging.getHandlerByName("queue").listener
+    listener.start()
+    atexit.register(listener.stop)
@@ -1,8 +1,5 @@
 import argparse
 import os
-import subprocess
-
-from stereo._version import __version__
 
 
 def main():
@@ -47,6 +44,12 @@ def main():
 
     args = parser.parse_args()
 
+    # imported only once we know we are going to use them, so that --help
+    # stays fast
+    import subprocess
+
+    from stereo._version import __version__
+
     if args.version:
         print(__version__)
         return 0
@@ -1,11 +1,17 @@
 import asyncio
 import logging
 import os
+from asyncio import Queue
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from operator import attrgetter
 from pathlib import Path
-from typing import Tuple
+from typing import Any, AsyncIterator, Callable, Tuple
 
 import aiosqlite
+import orjson
 
 from stereo.lib import Track
 from stereo.message import (
@@ -16,14 +22,304 @@ from stereo.message import (
 
 logger = logging.getLogger(__name__)
 
+# per-connection tuning; journal_mode=WAL is persistent and set once in init_db
+_PRAGMAS = """
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -64000;
+    PRAGMA mmap_size = 268435456;
+"""
+
+# rows per transaction for bulk writes, small enough for the page cache to hold
+_BATCH_SIZE = 1000
+
+# rows per multi-row INSERT; 500 rows x 17 columns stays well below SQLite's
+# default limit of 32766 bound variables; also the number of ids per IN list
+_ROWS_PER_INSERT = 500
+# rows fetched per round-trip to the connection's thread when streaming results
+_FETCH_SIZE = 256
+# filtered counts kept per pool before the cache is reset
+_MAX_CACHED_COUNTS = 64
+
+
+class AioSqlitePool:
+    """One read-write connection for writes plus up to `n_readers` read-only connections.
+
+    In WAL mode readers don't block the writer (or each other), so concurrent
+    queries no longer serialize on a single connection's worker thread.
+    """
+
+    def __init__(self, path: Path, n_readers: int = 4):
+        self.path = path
+        self.n_readers = n_readers
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._readers: Queue[aiosqlite.Connection] = Queue()
+        self._n_open_readers = 0
+        self._closed = False  # checked-out readers are closed when returned
+        # cached COUNT(*) of the tracks table; every commit resets it unless the
+        # write reported how many rows it added, and bumping the generation
+        # keeps counts still in flight at that point from being cached
+        self._count: int | None = None
+        self._count_delta: int | None = None
+        # COUNT(*) per filter (shape and parameters), dropped on every commit
+        self._filtered_counts: dict[tuple, int] = {}
+        self._generation = 0
+
+    async def _open(self, uri: str) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(uri, uri=True, iter_chunk_size=_FETCH_SIZE)
+        await db.executescript(_PRAGMAS)
+        return db
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self._readers.empty() and self._n_open_readers < self.n_readers:
+            self._n_open_readers += 1
+            try:
+                db = await self._open(f"{self.path.as_uri()}?mode=ro")
+            except BaseException:
+                self._n_open_readers -= 1
+                raise
+        else:
+            db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            if self._closed:
+                self._n_open_readers -= 1
+                await db.close()
+            else:
+                self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Serialize writes; commit on success, roll back on error.
+
+        A write that knows the net number of rows it added to (or removed
+        from) the tracks table sets `_count_delta`, which keeps the cached
+        count valid; otherwise the next count goes back to the table.
+        """
+        async with self._write_lock:
+            if self._writer is None:
+                self._writer = await self._open(self.path.as_uri())
+            db = self._writer
+            count, self._count, self._count_delta = self._count, None, None
+            count_after = None
+            try:
+                yield db
+            except BaseException:
+                await db.rollback()
+                raise
+            else:
+                await db.commit()
+                if count is not None and self._count_delta is not None:
+                    count_after = count + self._count_delta
+            finally:
+                # a count taken while the write was open saw the old snapshot
+                # (and the unchanged generation), and a failed bulk write may
+                # already have committed some of its batches: either way the
+                # cached counts can't be trusted any more
+                self._count, self._count_delta = count_after, None
+                self._filtered_counts.clear()
+                self._generation += 1
+
+    async def close(self) -> None:
+        self._closed = True
+        async with self._write_lock:
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+        while not self._readers.empty():
+            await self._readers.get_nowait().close()
+            self._n_open_readers -= 1
+
+
+# column order of Track.to_db_row(), which follows the model's field order
+_COLS = tuple(Track.model_fields.keys())
+_YT_ID = _COLS.index("yt_id")
+_FIELDS = ", ".join(_COLS)
+_PLACEHOLDERS = ", ".join(":" + c for c in _COLS)
+_INSERT_IGNORE = f"INSERT OR IGNORE INTO tracks ({_FIELDS}) VALUES ({_PLACEHOLDERS})"
+# replacing updates the existing row in place rather than deleting and
+# re-inserting it, so indexes on unchanged columns are left alone and the
+# track keeps its rowid
+_ON_CONFLICT_REPLACE = " ON CONFLICT(yt_id) DO UPDATE SET " + ", ".join(
+    f"{c} = excluded.{c}" for c in _COLS if c != "yt_id"
+)
+_INSERT_REPLACE = (
+    f"INSERT INTO tracks ({_FIELDS}) VALUES ({_PLACEHOLDERS})" + _ON_CONFLICT_REPLACE
+)
+
+_EXPECTED_COLUMNS = frozenset(_COLS)
+_ARTISTS_INDEX = _COLS.index("artists")
+_DATE_INDEXES = tuple(_COLS.index(field) for field in Track._date_fields())
+
+
+def _row_to_track(row: tuple) -> Track:
+    """Inverse of `Track.to_db_row` for a row of `SELECT {_FIELDS}`.
+
+    Skips validation: the values were validated on the way into the table.
+    """
+    values = list(row)
+    values[_ARTISTS_INDEX] = orjson.loads(values[_ARTISTS_INDEX])
+    for i in _DATE_INDEXES:
+        if values[i]:
+            values[i] = date.fromisoformat(values[i])
+    return Track.model_construct(**dict(zip(_COLS, values)))
+
+
+# trigram-indexed mirror of the free-text columns so that substring filters
+# ('%foo%') don't have to scan the whole tracks table; kept in sync by triggers
+# (replacing a track is an upsert, so it goes through the update trigger)
+_FTS_COLUMNS = ("title", "artists", "album")
+_FTS_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+        title, artists, album, content='tracks', tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS tracks_fts_insert AFTER INSERT ON tracks BEGIN
+        INSERT INTO tracks_fts(rowid, title, artists, album)
+        VALUES (new.rowid, new.title, new.artists, new.album);
+    END;
+    CREATE TRIGGER IF NOT EXISTS tracks_fts_delete AFTER DELETE ON tracks BEGIN
+        INSERT INTO tracks_fts(tracks_fts, rowid, title, artists, album)
+        VALUES ('delete', old.rowid, old.title, old.artists, old.album);
+    END;
+    -- only edits of the mirrored columns need to touch the index, not ratings
+    -- or play counts; collections from schema version 1 get it replaced
+    DROP TRIGGER IF EXISTS tracks_fts_update;
+    CREATE TRIGGER tracks_fts_update AFTER UPDATE OF title, artists, album ON tracks
+    BEGIN
+        INSERT INTO tracks_fts(tracks_fts, rowid, title, artists, album)
+        VALUES ('delete', old.rowid, old.title, old.artists, old.album);
+        INSERT INTO tracks_fts(rowid, title, artists, album)
+        VALUES (new.rowid, new.title, new.artists, new.album);
+    END;
+"""
+
+# columns the grid commonly sorts and filters by
+_INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_tracks_artists ON tracks(artists);
+    CREATE INDEX IF NOT EXISTS idx_tracks_title ON tracks(title);
+    CREATE INDEX IF NOT EXISTS idx_tracks_bpm ON tracks(bpm);
+    CREATE INDEX IF NOT EXISTS idx_tracks_genre ON tracks(genre);
+    CREATE INDEX IF NOT EXISTS idx_tracks_key ON tracks(key);
+    CREATE INDEX IF NOT EXISTS idx_tracks_label ON tracks(label);
+    CREATE INDEX IF NOT EXISTS idx_tracks_release_date ON tracks(release_date);
+    CREATE INDEX IF NOT EXISTS idx_tracks_last_played ON tracks(last_played);
+"""
+
+
+@lru_cache(maxsize=8)
+def _insert_rows_sql(ignore_existing: bool, n_rows: int) -> str:
+    """INSERT statement with `n_rows` positional VALUES tuples."""
+    row = f"({', '.join('?' * len(_COLS))})"
+    values = ", ".join([row] * n_rows)
+    if ignore_existing:
+        return f"INSERT OR IGNORE INTO tracks ({_FIELDS}) VALUES {values}"
+    return f"INSERT INTO tracks ({_FIELDS}) VALUES {values}" + _ON_CONFLICT_REPLACE
+
+
+@lru_cache(maxsize=8)
+def _delete_ids_sql(n_ids: int) -> str:
+    return f"DELETE FROM tracks WHERE yt_id IN ({', '.join('?' * n_ids)})"
+
+
+@lru_cache(maxsize=8)
+def _select_ids_sql(n_ids: int) -> str:
+    return f"SELECT yt_id FROM tracks WHERE yt_id IN ({', '.join('?' * n_ids)})"
+
+
+# long-lived connection pools shared by all contexts pointing at the same file
+_pools: dict[Path, AioSqlitePool] = {}
+# number of users (sessions, the server itself) holding on to each collection;
+# a pool is closed once the last of them lets go, see `retain` and `release`
+_refs: dict[Path, int] = {}
+
 
 @dataclass
 class Context:
     path: Path
 
+    @property
+    def pool(self) -> AioSqlitePool:
+        path = Path(self.path).absolute()
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = AioSqlitePool(path)
+        return pool
+
+    def reader(self):
+        return self.pool.reader()
+
+    def writer(self):
+        return self.pool.writer()
+
+    async def close(self) -> None:
+        pool = _pools.pop(Path(self.path).absolute(), None)
+        if pool is not None:
+            await pool.close()
+
+
+async def close_all() -> None:
+    _refs.clear()
+    for path in list(_pools):
+        await Context(path).close()
+
+
+def retain(path: Path | str) -> None:
+    """Keep the pool for `path` open until a matching `release`."""
+    key = Path(path).absolute()
+    _refs[key] = _refs.get(key, 0) + 1
+
+
+async def release(path: Path | str) -> None:
+    """Undo one `retain`, closing the pool if nobody else retains `path`."""
+    key = Path(path).absolute()
+    n = _refs.get(key, 0) - 1
+    if n > 0:
+        _refs[key] = n
+    else:
+        _refs.pop(key, None)
+        await Context(key).close()
+
+
+@asynccontextmanager
+async def using(path: Path | str) -> AsyncIterator[Context]:
+    """Context for a one-off use of the collection at `path`."""
+    retain(path)
+    try:
+        yield Context(Path(path))
+    finally:
+        await release(path)
+
+
+@asynccontextmanager
+async def _connect(path: Path | str) -> AsyncIterator[aiosqlite.Connection]:
+    async with aiosqlite.connect(path) as db:
+        await db.executescript(_PRAGMAS)
+        yield db
+
+
+async def _table_columns(db: aiosqlite.Connection, schema: str) -> set[str]:
+    rows = await db.execute_fetchall(f"PRAGMA {schema}.table_info(tracks)")
+    return {row[1] for row in rows}
+
+
+# stored in PRAGMA user_version once init_db has run to completion; bump it
+# whenever the schema below changes so existing collections get upgraded
+_SCHEMA_VERSION = 2
+
 
 async def init_db(ctx: Context) -> None:
-    async with aiosqlite.connect(ctx.path) as db:
+    if os.path.exists(ctx.path):
+        async with ctx.reader() as db:
+            async with db.execute("PRAGMA user_version") as cursor:
+                (version,) = await cursor.fetchone()
+        if version >= _SCHEMA_VERSION:
+            return
+
+    async with ctx.writer() as db:
+        await db.execute("PRAGMA journal_mode = WAL")
         await db.execute("""
             CREATE TABLE IF NOT EXISTS tracks (
                 yt_id TEXT PRIMARY KEY,
@@ -45,7 +341,15 @@ async def init_db(ctx: Context) -> None:
                 last_played TEXT
             )
         """)
-        await db.commit()
+        async with db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tracks_fts'"
+        ) as cursor:
+            has_fts = await cursor.fetchone() is not None
+        await db.executescript(_FTS_SCHEMA)
+        if not has_fts:
+            await db.execute("INSERT INTO tracks_fts(tracks_fts) VALUES ('rebuild')")
+        await db.executescript(_INDEXES)
+        await db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
 
 
 async def insert_track(
@@ -55,83 +359,137 @@ async def insert_track(
 
     data = track.to_db_row()
 
-    fields = ", ".join(data.keys())
-    placeholders = ", ".join([":" + k for k in data.keys()])
-
-    on_conflict = "IGNORE" if ignore_if_exists else "REPLACE"
-
-    async with aiosqlite.connect(ctx.path) as db:
-        await db.execute(
-            f"INSERT OR {on_conflict} INTO tracks ({fields}) VALUES ({placeholders})",
-            data,
+    async with ctx.writer() as db:
+        cursor = await db.execute(
+            _INSERT_IGNORE if ignore_if_exists else _INSERT_REPLACE, data
         )
-        await db.commit()
+        if ignore_if_exists:
+            # an ignored conflict changes 0 rows; a replacement would count 1
+            # either way, so only the IGNORE variant tells us the delta
+            ctx.pool._count_delta = cursor.rowcount
 
 
 async def insert_tracks(
     ctx: Context, tracks: list[Track], ignore_existing: bool = True
-):
-    logger.info(f"inserting tracks into db: {tracks}")
-    params = []
-    for track in tracks:
-        params.append(track.to_db_row())
+) -> int:
+    """Insert `tracks`, skipping or replacing existing ones with the same id.
 
-    if not params:
-        return
+    Returns the number of tracks that were not in the collection before.
+    """
+    logger.info(f"inserting {len(tracks)} tracks into db")
+    rows = [tuple(track.to_db_row().values()) for track in tracks]
 
-    on_conflict = "IGNORE" if ignore_existing else "REPLACE"
+    if not rows:
+        return 0
 
-    # Extract column names from the first dictionary to build the query
-    columns = params[0].keys()
-    fields = ", ".join(columns)
-    placeholders = ", ".join([":" + k for k in columns])
-    query = f"INSERT OR {on_conflict} INTO tracks ({fields}) VALUES ({placeholders})"
+    multi_row_query = _insert_rows_sql(ignore_existing, _ROWS_PER_INSERT)
+    single_row_query = _insert_rows_sql(ignore_existing, 1)
+
+    n = 0
+    async with ctx.writer() as db:
+        for i in range(0, len(rows), _BATCH_SIZE):
+            batch = rows[i : i + _BATCH_SIZE]
+            n_multi = len(batch) - len(batch) % _ROWS_PER_INSERT
+            await db.execute("BEGIN IMMEDIATE")
+            if not ignore_existing:
+                # a replacement counts as a change just like a new row, so
+                # look up which ids are already there (by primary key, far
+                # cheaper than recounting the table afterwards)
+                ids = list(dict.fromkeys(row[_YT_ID] for row in batch))
+                n += len(ids)
+                for j in range(0, len(ids), _ROWS_PER_INSERT):
+                    chunk = ids[j : j + _ROWS_PER_INSERT]
+                    existing = await db.execute_fetchall(
+                        _select_ids_sql(len(chunk)), chunk
+                    )
+                    n -= len(existing)
+            for j in range(0, n_multi, _ROWS_PER_INSERT):
+                values = [v for row in batch[j : j + _ROWS_PER_INSERT] for v in row]
+                cursor = await db.execute(multi_row_query, values)
+                if ignore_existing:
+                    n += cursor.rowcount
+            # leftovers go through the single-row statement
+            cursor = await db.executemany(single_row_query, batch[n_multi:])
+            if ignore_existing:
+                n += max(cursor.rowcount, 0)
+            await db.commit()
+        ctx.pool._count_delta = n
+    return n
 
-    async with aiosqlite.connect(ctx.path) as db:
-        await db.executemany(query, params)
-        await db.commit()
 
+@lru_cache(maxsize=128)
+def _update_sql(keys: frozenset[str]) -> str:
+    set_clause = ", ".join(f"{_check_column(k)} = :{k}" for k in keys)
+    return f"UPDATE tracks SET {set_clause} WHERE yt_id = :yt_id RETURNING {_FIELDS}"
 
-async def update_track(ctx: Context, yt_id: str, updates: dict) -> None:
-    set_clause = ", ".join([f"{k} = :{k}" for k in updates.keys()])
-    updates["yt_id"] = yt_id  # Ensure ID is in the params dict
 
-    async with aiosqlite.connect(ctx.path) as db:
-        await db.execute(
-            f"UPDATE tracks SET {set_clause} WHERE yt_id = :yt_id", updates
-        )
-        await db.commit()
+async def update_track(ctx: Context, yt_id: str, updates: dict) -> Track | None:
+    """Apply `updates` to the track and return it as stored afterwards
+    (None if there is no track with that id)."""
+    query = _update_sql(frozenset(updates))
+    params = {**updates, "yt_id": yt_id}
+
+    async with ctx.writer() as db:
+        async with db.execute(query, params) as cursor:
+            row = await cursor.fetchone()
+        ctx.pool._count_delta = 0
+    return _row_to_track(row) if row is not None else None
+
+
+_INC_PLAY_COUNT = (
+    "UPDATE tracks SET play_count = play_count + 1, last_played = ?"
+    f" WHERE yt_id = ? RETURNING {_FIELDS}"
+)
+
+
+async def increment_play_count(ctx: Context, yt_id: str) -> Track | None:
+    """Count a play of the track today and return it as stored afterwards
+    (None if there is no track with that id)."""
+    async with ctx.writer() as db:
+        async with db.execute(
+            _INC_PLAY_COUNT, (date.today().isoformat(), yt_id)
+        ) as cursor:
+            row = await cursor.fetchone()
+        ctx.pool._count_delta = 0
+    return _row_to_track(row) if row is not None else None
 
 
 async def delete_track(ctx: Context, yt_id: str) -> None:
     logger.info(f"deleting track with yt_id: {yt_id}")
-    async with aiosqlite.connect(ctx.path) as db:
-        await db.execute("DELETE FROM tracks WHERE yt_id = ?", (yt_id,))
-        await db.commit()
+    async with ctx.writer() as db:
+        cursor = await db.execute("DELETE FROM tracks WHERE yt_id = ?", (yt_id,))
+        ctx.pool._count_delta = -cursor.rowcount
 
 
 async def delete_tracks(ctx: Context, yt_ids: list[str]) -> int:
-    logger.info(f"deleting tracks: {yt_ids}")
+    logger.info(f"deleting {len(yt_ids)} tracks")
     if not yt_ids:
         return 0
 
-    id_params = [(yt_id,) for yt_id in yt_ids]
-
-    async with aiosqlite.connect(ctx.path) as db:
-        await db.executemany("DELETE FROM tracks WHERE yt_id = ?", id_params)
-        await db.commit()
-        return db.total_changes
+    n = 0
+    async with ctx.writer() as db:
+        for i in range(0, len(yt_ids), _BATCH_SIZE):
+            batch = yt_ids[i : i + _BATCH_SIZE]
+            await db.execute("BEGIN IMMEDIATE")
+            for j in range(0, len(batch), _ROWS_PER_INSERT):
+                chunk = batch[j : j + _ROWS_PER_INSERT]
+                cursor = await db.execute(_delete_ids_sql(len(chunk)), chunk)
+                n += cursor.rowcount
+            await db.commit()
+        ctx.pool._count_delta = -n
+    return n
 
 
-async def get_tracks(
+async def iter_tracks(
     ctx: Context,
     filter_by: dict | None = None,
     sort_by: str | None = None,
     descending: bool = False,
     limit: int | None = None,
     offset: int | None = None,
-) -> list[Track]:
-    query = "SELECT * FROM tracks"
+) -> AsyncIterator[Track]:
+    """Like `get_tracks` but yields tracks as rows are fetched, in chunks of `_FETCH_SIZE`."""
+    query = f"SELECT {_FIELDS} FROM tracks"
     params = []
 
     if filter_by:
@@ -150,134 +508,211 @@ async def get_tracks(
             query += " OFFSET ?"
             params.append(offset)
 
-    async with aiosqlite.connect(ctx.path) as db:
-        db.row_factory = aiosqlite.Row
+    async with ctx.reader() as db:
         async with db.execute(query, params) as cursor:
-            rows = await cursor.fetchall()
+            async for row in cursor:
+                yield _row_to_track(row)
+
 
-            results = []
-            for row in rows:
-                results.append(Track.from_db_row(dict(row)))
-            return results
+async def get_tracks(
+    ctx: Context,
+    filter_by: dict | None = None,
+    sort_by: str | None = None,
+    descending: bool = False,
+    limit: int | None = None,
+    offset: int | None = None,
+) -> list[Track]:
+    return [
+        track
+        async for track in iter_tracks(
+            ctx, filter_by, sort_by, descending, limit, offset
+        )
+    ]
 
 
 async def get_track(
     ctx: Context,
     yt_id: str,
 ) -> Track | None:
-    query = "SELECT * FROM tracks WHERE yt_id = ?"
+    query = f"SELECT {_FIELDS} FROM tracks WHERE yt_id = ?"
 
-    async with aiosqlite.connect(ctx.path) as db:
-        db.row_factory = aiosqlite.Row
+    async with ctx.reader() as db:
         async with db.execute(query, (yt_id,)) as cursor:
             row = await cursor.fetchone()
             if row:
-                return Track.from_db_row(dict(row))
+                return _row_to_track(row)
 
             return None
 
 
 async def get_random_track(ctx: Context, filter_by: dict | None = None) -> Track | None:
-    query = "SELECT * FROM tracks"
+    # Draw a random rowid and take the first (matching) row at or after it,
+    # wrapping around to the start of the table if there is none. This is an
+    # index seek, unlike ORDER BY RANDOM() which sorts the whole table.
+    conditions = []
     params = []
 
     if filter_by:
         conditions = [f"{key} = ?" for key in filter_by.keys()]
-        query += " WHERE " + " AND ".join(conditions)
         params = list(filter_by.values())
 
-    query += " ORDER BY RANDOM() LIMIT 1"
+    where = " AND ".join(
+        ["rowid >= ABS(RANDOM()) % (SELECT MAX(rowid) FROM tracks) + 1", *conditions]
+    )
+    query = f"SELECT {_FIELDS} FROM tracks WHERE {where} ORDER BY rowid LIMIT 1"
 
-    async with aiosqlite.connect(ctx.path) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(query, params) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return Track.from_db_row(dict(row))
-            return None
+    wrap_around_query = f"SELECT {_FIELDS} FROM tracks"
+    if conditions:
+        wrap_around_query += " WHERE " + " AND ".join(conditions)
+    wrap_around_query += " ORDER BY rowid LIMIT 1"
+
+    async with ctx.reader() as db:
+        for q in (query, wrap_around_query):
+            async with db.execute(q, params) as cursor:
+                row = await cursor.fetchone()
+                if row:
+                    return _row_to_track(row)
+        return None
 
 
 async def get_total_track_count(ctx: Context) -> int:
-    async with aiosqlite.connect(ctx.path) as db:
+    pool = ctx.pool
+    if pool._count is not None:
+        return pool._count
+    generation = pool._generation
+    async with ctx.reader() as db:
         async with db.execute("SELECT COUNT(*) FROM tracks") as cursor:
             row = await cursor.fetchone()
-            return row[0] if row else 0
+            count = row[0] if row else 0
+    if pool._generation == generation:
+        pool._count = count
+    return count
+
+
+def _filter_shape(
+    filterModel: dict[str, FilterModelItem | CombinedFilterModelItem],
+) -> tuple[tuple[str, str, str], ...]:
+    return tuple(
+        (field, item.filterType, item.type)
+        for field, item in filterModel.items()
+        if isinstance(item, FilterModelItem)
+    )
+
+
+def _sort_shape(sortModel: list[SortModelItem]) -> tuple[tuple[str, str], ...]:
+    return tuple((item.colId, item.sort) for item in sortModel)
+
+
+def _check_column(col: str) -> str:
+    # column names end up in the SQL text, so only ever accept known ones
+    if col not in _COLS:
+        raise ValueError(f"unknown column: {col}")
+    return col
+
+
+def _contains_pattern(item: FilterModelItem) -> str:
+    return f"%{item.filter}%"
+
+
+_get_filter = attrgetter("filter")
+_get_filter_to = attrgetter("filterTo")
+_get_date_from = attrgetter("dateFrom")
+_get_date_to = attrgetter("dateTo")
+
+# (filterType, type) -> (conditions, accessors yielding one parameter per "?")
+_FILTER_OPS: dict[
+    tuple[str, str],
+    tuple[tuple[str, ...], tuple[Callable[[FilterModelItem], Any], ...]],
+] = {
+    ("text", "contains"): (("{field} LIKE ?",), (_contains_pattern,)),
+    ("text", "equals"): (("{field} = ?",), (_get_filter,)),
+    ("text", "notEqual"): (("{field} <> ?",), (_get_filter,)),
+    ("text", "blank"): (("{field} IS NULL",), ()),
+    ("text", "notBlank"): (("{field} IS NOT NULL",), ()),
+    ("number", "greaterThan"): (("{field} > ?",), (_get_filter,)),
+    ("number", "greaterThanOrEqual"): (("{field} >= ?",), (_get_filter,)),
+    ("number", "lessThan"): (("{field} < ?",), (_get_filter,)),
+    ("number", "lessThanOrEqual"): (("{field} <= ?",), (_get_filter,)),
+    ("number", "equals"): (("{field} = ?",), (_get_filter,)),
+    ("number", "notEqual"): (("{field} <> ?",), (_get_filter,)),
+    ("number", "blank"): (("{field} IS NULL",), ()),
+    ("number", "notBlank"): (("{field} IS NOT NULL",), ()),
+    ("number", "inRange"): (
+        ("{field} >= ?", "{field} < ?"),
+        (_get_filter, _get_filter_to),
+    ),
+    ("date", "equals"): (("{field} = ?",), (_get_date_from,)),
+    ("date", "notEqual"): (("{field} <> ?",), (_get_date_from,)),
+    ("date", "greaterThan"): (("{field} > ?",), (_get_date_from,)),
+    ("date", "lessThan"): (("{field} < ?",), (_get_date_from,)),
+    ("date", "lessThanOrEqual"): (("{field} <= ?",), (_get_date_from,)),
+    ("date", "inRange"): (
+        ("{field} >= ?", "{field} < ?"),
+        (_get_date_from, _get_date_to),
+    ),
+}
+
+# substring search on free-text columns goes through the trigram index
+_FTS_CONTAINS = "rowid IN (SELECT rowid FROM tracks_fts WHERE {field} LIKE ?)"
+
+
+@lru_cache(maxsize=256)
+def _compile_filter(
+    filter_shape: tuple[tuple[str, str, str], ...],
+) -> tuple[str, tuple[tuple[Callable[[FilterModelItem], Any], ...], ...]]:
+    """WHERE clause for a filter shape, plus per filter item the accessors
+    producing its query parameters. Unsupported operators are ignored."""
+    where_clauses = []
+    accessors = []
+
+    for field, filter_type, op in filter_shape:
+        field = _check_column(field)
+        conditions, getters = _FILTER_OPS.get((filter_type, op), ((), ()))
+        if (filter_type, op) == ("text", "contains") and field in _FTS_COLUMNS:
+            conditions = (_FTS_CONTAINS,)
+        where_clauses.extend(c.format(field=field) for c in conditions)
+        accessors.append(getters)
+
+    where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    return where, tuple(accessors)
+
+
+def _where_clause(filter_shape: tuple[tuple[str, str, str], ...]) -> str:
+    return _compile_filter(filter_shape)[0]
+
+
+def _filter_params(
+    filterModel: dict[str, FilterModelItem | CombinedFilterModelItem],
+) -> list:
+    """Query parameters matching the placeholders emitted by `_where_clause`."""
+    items = [item for item in filterModel.values() if isinstance(item, FilterModelItem)]
+    _, accessors = _compile_filter(_filter_shape(filterModel))
+    return [get(item) for item, getters in zip(items, accessors) for get in getters]
 
 
 def where_clause_from_filter_model(
     filterModel: dict[str, FilterModelItem | CombinedFilterModelItem],
 ) -> Tuple[str, list] | None:
-    where_clauses = []
-    params: list = []
-
-    for field, item in filterModel.items():
-        if isinstance(item, FilterModelItem):
-            if item.filterType == "text":
-                if item.type == "contains":
-                    where_clauses.append(f"{field} LIKE ?")
-                    params.append(f"%{item.filter}%")
-                elif item.type == "equals":
-                    where_clauses.append(f"{field} = ?")
-                    params.append(item.filter)
-                elif item.type == "notEqual":
-                    where_clauses.append(f"{field} <> ?")
-                    params.append(item.filter)
-                elif item.type == "blank":
-                    where_clauses.append(f"{field} IS NULL")
-                elif item.type == "notBlank":
-                    where_clauses.append(f"{field} IS NOT NULL")
-            elif item.filterType == "number":
-                if item.type == "greaterThan":
-                    where_clauses.append(f"{field} > ?")
-                    params.append(item.filter)
-                elif item.type == "greaterThanOrEqual":
-                    where_clauses.append(f"{field} >= ?")
-                    params.append(item.filter)
-                elif item.type == "lessThan":
-                    where_clauses.append(f"{field} < ?")
-                    params.append(item.filter)
-                elif item.type == "lessThanOrEqual":
-                    where_clauses.append(f"{field} <= ?")
-                    params.append(item.filter)
-                elif item.type == "equals":
-                    where_clauses.append(f"{field} = ?")
-                    params.append(item.filter)
-                elif item.type == "notEqual":
-                    where_clauses.append(f"{field} <> ?")
-                    params.append(item.filter)
-                elif item.type == "blank":
-                    where_clauses.append(f"{field} IS NULL")
-                elif item.type == "notBlank":
-                    where_clauses.append(f"{field} IS NOT NULL")
-                elif item.type == "inRange":
-                    where_clauses.append(f"{field} >= ?")
-                    params.append(item.filter)
-                    where_clauses.append(f"{field} < ?")
-                    params.append(item.filterTo)
-            elif item.filterType == "date":
-                if item.type == "equals":
-                    where_clauses.append(f"{field} = ?")
-                    params.append(item.dateFrom)
-                elif item.type == "notEqual":
-                    where_clauses.append(f"{field} <> ?")
-                    params.append(item.dateFrom)
-                elif item.type == "greaterThan":
-                    where_clauses.append(f"{field} > ?")
-                    params.append(item.dateFrom)
-                elif item.type == "lessThan":
-                    where_clauses.append(f"{field} < ?")
-                    params.append(item.dateFrom)
-                elif item.type == "lessThanOrEqual":
-                    where_clauses.append(f"{field} <= ?")
-                    params.append(item.dateFrom)
-                elif item.type == "inRange":
-                    where_clauses.append(f"{field} >= ?")
-                    params.append(item.dateFrom)
-                    where_clauses.append(f"{field} < ?")
-                    params.append(item.dateTo)
-
-    if where_clauses:
-        return " WHERE " + " AND ".join(where_clauses), params
+    where_clause = _where_clause(_filter_shape(filterModel))
+    if where_clause:
+        return where_clause, _filter_params(filterModel)
+
+
+@lru_cache(maxsize=256)
+def _rows_query(
+    filter_shape: tuple[tuple[str, str, str], ...],
+    sort_shape: tuple[tuple[str, str], ...],
+) -> str:
+    query = f"SELECT {_FIELDS} FROM tracks" + _where_clause(filter_shape)
+
+    if sort_shape:
+        sort_parts: list[str] = []
+        for col, sort in sort_shape:
+            direction = "ASC" if sort == "asc" else "DESC"
+            sort_parts.append(f"{_check_column(col)} {direction}")
+        query += " ORDER BY " + ", ".join(sort_parts)
+
+    return query + " LIMIT ? OFFSET ?"
 
 
 # for ag-grid data source
@@ -288,85 +723,98 @@ async def get_rows(
     sortModel: list[SortModelItem],
     filterModel: dict[str, FilterModelItem | CombinedFilterModelItem],
 ) -> list[Track]:
-    query = "SELECT * FROM tracks"
-
-    params: list = []
-
-    where_clause_and_params = where_clause_from_filter_model(filterModel)
-    if where_clause_and_params:
-        query += where_clause_and_params[0]
-        params.extend(where_clause_and_params[1])
-
-    if sortModel:
-        sort_parts: list[str] = []
-        for sort_item in sortModel:
-            direction = "ASC" if sort_item.sort == "asc" else "DESC"
-            sort_parts.append(f"{sort_item.colId} {direction}")
-        query += " ORDER BY " + ", ".join(sort_parts)
-
-    query += " LIMIT ? OFFSET ?"
+    query = _rows_query(_filter_shape(filterModel), _sort_shape(sortModel))
+    params = _filter_params(filterModel)
     params.extend([endRow - startRow, startRow])
 
-    async with aiosqlite.connect(ctx.path) as db:
-        db.row_factory = aiosqlite.Row
+    async with ctx.reader() as db:
         async with db.execute(query, params) as cursor:
-            rows = await cursor.fetchall()
-            results = []
-            for row in rows:
-                results.append(Track.from_db_row(dict(row)))
-            return results
+            return [_row_to_track(row) async for row in cursor]
 
 
 async def count_rows(
     ctx: Context,
     filterModel: dict[str, FilterModelItem | CombinedFilterModelItem] = {},
 ) -> int:
-    query = "SELECT COUNT(*) FROM tracks"
-    params: list = []
-
-    where_clause_and_params = where_clause_from_filter_model(filterModel)
-    if where_clause_and_params:
-        query += where_clause_and_params[0]
-        params.extend(where_clause_and_params[1])
-
-    async with aiosqlite.connect(ctx.path) as db:
+    if not filterModel:
+        return await get_total_track_count(ctx)
+
+    shape = _filter_shape(filterModel)
+    params = _filter_params(filterModel)
+    # scrolling the grid asks for the same filtered count with every page
+    pool = ctx.pool
+    key = (shape, *params)
+    try:
+        count = pool._filtered_counts.get(key)
+    except TypeError:  # unhashable filter value, don't cache
+        key = None
+    else:
+        if count is not None:
+            return count
+    generation = pool._generation
+    query = "SELECT COUNT(*) FROM tracks" + _where_clause(shape)
+    async with ctx.reader() as db:
         async with db.execute(query, params) as cursor:
             row = await cursor.fetchone()
-            return row[0] if row else 0
+            count = row[0] if row else 0
+    if key is not None and pool._generation == generation:
+        if len(pool._filtered_counts) >= _MAX_CACHED_COUNTS:
+            pool._filtered_counts.clear()
+        pool._filtered_counts[key] = count
+    return count
 
 
-async def migrate_from_old_db(new_db_path: str, old_db_path: str):
-    ctx = Context(Path(new_db_path))
-    await init_db(ctx)
-    async with aiosqlite.connect(ctx.path) as db:
-        await db.execute("ATTACH DATABASE ? AS old_db", (old_db_path,))
-        try:
-            async with db.execute("PRAGMA main.table_info(tracks)") as cursor:
-                new_cols = {row[1] for row in await cursor.fetchall()}
+async def _drop_indexes(db: aiosqlite.Connection) -> list[str]:
+    """Drop the indexes on main.tracks, returning the SQL to recreate them.
 
-            async with db.execute("PRAGMA old_db.table_info(tracks)") as cursor:
-                old_cols = {row[1] for row in await cursor.fetchall()}
+    Bulk copies are much faster when indexes are rebuilt once afterwards
+    than when they are maintained row by row.
+    """
+    rows = await db.execute_fetchall(
+        "SELECT name, sql FROM main.sqlite_master"
+        " WHERE type = 'index' AND tbl_name = 'tracks' AND sql IS NOT NULL"
+    )
+    for name, _ in rows:
+        await db.execute(f'DROP INDEX main."{name}"')
+    return [sql for _, sql in rows]
 
-            common_cols = list(new_cols.intersection(old_cols))
-            if not common_cols:
-                print("No matching columns found to migrate.")
-                return
 
-            col_names_str = ", ".join(common_cols)
-            query = f"""
-                INSERT OR IGNORE INTO main.tracks ({col_names_str})
-                SELECT {col_names_str} FROM old_db.tracks
-            """
-            await db.execute(query)
-            await db.commit()
+async def migrate_from_old_db(new_db_path: str, old_db_path: str):
+    async with using(new_db_path) as ctx:
+        await init_db(ctx)
+        async with ctx.writer() as db:
+            await db.execute("ATTACH DATABASE ? AS old_db", (old_db_path,))
+            try:
+                new_cols, old_cols = await asyncio.gather(
+                    _table_columns(db, "main"), _table_columns(db, "old_db")
+                )
+
+                common_cols = list(new_cols.intersection(old_cols))
+                if not common_cols:
+                    print("No matching columns found to migrate.")
+                    return
+
+                col_names_str = ", ".join(common_cols)
+                query = f"""
+                    INSERT OR IGNORE INTO main.tracks ({col_names_str})
+                    SELECT {col_names_str} FROM old_db.tracks
+                """
+                # one transaction, so a failed copy also restores the indexes
+                await db.execute("BEGIN IMMEDIATE")
+                index_sql = await _drop_indexes(db)
+                cursor = await db.execute(query)
+                n = cursor.rowcount
+                for sql in index_sql:
+                    await db.execute(sql)
+                await db.commit()
 
-            async with db.execute("SELECT changes()") as cursor:
-                row = await cursor.fetchone()
-                n = row[0] if row is not None else 0
                 print(f"Migration complete. {n} tracks imported.")
 
-        finally:
-            await db.execute("DETACH DATABASE old_db")
+            except BaseException:
+                await db.rollback()
+                raise
+            finally:
+                await db.execute("DETACH DATABASE old_db")
 
 
 async def import_from_db(ctx: Context, source_db: str, keep_user_data: bool):
@@ -390,19 +838,17 @@ async def import_from_db(ctx: Context, source_db: str, keep_user_data: bool):
     if keep_user_data:
         cols.extend(["rating", "play_count", "last_played"])
 
-    async with aiosqlite.connect(ctx.path) as db:
+    async with ctx.writer() as db:
         await db.execute("ATTACH DATABASE ? AS source_db", (source_db,))
         try:
-            async with db.execute("PRAGMA main.table_info(tracks)") as cursor:
-                target_cols = {row[1] for row in await cursor.fetchall()}
+            target_cols, source_cols = await asyncio.gather(
+                _table_columns(db, "main"), _table_columns(db, "source_db")
+            )
 
             for col in cols:
                 if col not in target_cols:
                     raise ValueError(f"{col} not in {target_cols}")
 
-            async with db.execute("PRAGMA source_db.table_info(tracks)") as cursor:
-                source_cols = {row[1] for row in await cursor.fetchall()}
-
             cols_to_import = list(set(cols).intersection(source_cols))
 
             if not cols_to_import:
@@ -414,36 +860,39 @@ async def import_from_db(ctx: Context, source_db: str, keep_user_data: bool):
                 INSERT OR IGNORE INTO main.tracks ({col_names_str})
                 SELECT {col_names_str} FROM source_db.tracks
             """
-            await db.execute(query)
+            await db.execute("BEGIN IMMEDIATE")
+            index_sql = await _drop_indexes(db)
+            cursor = await db.execute(query)
+            n = cursor.rowcount
+            for sql in index_sql:
+                await db.execute(sql)
             await db.commit()
 
-            async with db.execute("SELECT changes()") as cursor:
-                row = await cursor.fetchone()
-                n = row[0] if row is not None else 0
-                logger.info(f"Importing complete. {n} tracks imported.")
+            logger.info(f"Importing complete. {n} tracks imported.")
 
+        except BaseException:
+            await db.rollback()
+            raise
         finally:
             await db.execute("DETACH DATABASE source_db")
 
 
 async def track_exists(ctx: Context, yt_id: str) -> bool:
-    # 'SELECT 1' is a convention to check existence without fetching column data
-    query = "SELECT 1 FROM tracks WHERE yt_id = ? LIMIT 1"
+    # EXISTS always yields exactly one row: 1 or 0
+    query = "SELECT EXISTS(SELECT 1 FROM tracks WHERE yt_id = ?)"
 
-    async with aiosqlite.connect(ctx.path) as db:
+    async with ctx.reader() as db:
         async with db.execute(query, (yt_id,)) as cursor:
-            row = await cursor.fetchone()
-            return row is not None
+            (exists,) = await cursor.fetchone()
+            return bool(exists)
 
 
 async def validate_db_schema(db_path: Path | str) -> bool:
     if not os.path.exists(db_path):
         return False
 
-    expected_columns = set(Track.model_fields.keys())
-
     try:
-        async with aiosqlite.connect(db_path) as db:
+        async with _connect(db_path) as db:
             # PRAGMA table_info returns: (id, name, type, notnull, default_value, pk)
             async with db.execute("PRAGMA table_info(tracks)") as cursor:
                 rows = await cursor.fetchall()
@@ -455,7 +904,7 @@ async def validate_db_schema(db_path: Path | str) -> bool:
                 found_columns = {row[1] for row in rows}
                 pk_columns = {row[1] for row in rows if row[5] == 1}
 
-                if not expected_columns.issubset(found_columns):
+                if not _EXPECTED_COLUMNS.issubset(found_columns):
                     return False
 
                 if "yt_id" not in pk_columns:
@@ -508,7 +957,7 @@ async def get_row_index(
 
     params.append(yt_id)
 
-    async with aiosqlite.connect(ctx.path) as db:
+    async with ctx.reader() as db:
         async with db.execute(query, params) as cursor:
             row = await cursor.fetchone()
             return row[0] if row else -1
@@ -518,5 +967,6 @@ if __name__ == "__main__":
 
     async def run():
         await migrate_from_old_db("/path/to/new/stereo.db", "/path/to/old/stereo.db")
+        await close_all()
 
     asyncio.run(run())
@@ -2,18 +2,24 @@ import asyncio
 import csv
 import json
 import logging
+import random
+import re
 import time
+from contextlib import aclosing
 from dataclasses import dataclass
-from datetime import date, datetime
+from datetime import date, timedelta
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, AsyncGenerator
 
-import thefuzz.fuzz
-import thefuzz.process
+import orjson
 import yaml
-from aiohttp import ClientSession
+from aiohttp import ClientResponseError, ClientSession, ClientTimeout, TCPConnector
+from aiohttp_client_cache import CachedSession, SQLiteBackend
 from bs4 import BeautifulSoup
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
 
 logger = logging.getLogger(__name__)
 
@@ -138,7 +144,7 @@ class Track(BaseModel):
         return data
 
     def from_db_row(row: dict[str, Any]):
-        row["artists"] = json.loads(row["artists"])
+        row["artists"] = orjson.loads(row["artists"])
 
         for field in Track._date_fields():
             if row[field]:
@@ -148,17 +154,30 @@ class Track(BaseModel):
 
 
 def sort_key_track(track: Track):
-    return f"{','.join(track.artists)} {track.release_date} {track.title}"
+    return (tuple(track.artists), track.release_date or date.min, track.title)
+
+
+# libyaml-backed (C) loader/dumper when PyYAML was built with it
+_YAMLLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAMLDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+_tracks_adapter = TypeAdapter(list[Track])
 
 
 def dump_to_yaml(out_file: str, tracks: list[Track]):
     t1 = time.time()
-    tracks_by_yt_id: dict[str, Track] = {t.yt_id: t for t in tracks}
-    tracks = list(tracks_by_yt_id.values())
-    tracks.sort(key=sort_key_track)
+    # de-duplicate by yt_id (last one wins) and sort in one go
+    tracks = sorted({t.yt_id: t for t in tracks}.values(), key=sort_key_track)
 
     with open(out_file, "w") as f:
-        yaml.dump({"tracks": [t.model_dump() for t in tracks]}, f)
+        # JSON mode turns dates into ISO strings in pydantic's serializer, so
+        # the C emitter doesn't have to call back into a Python representer
+        yaml.dump(
+            {"tracks": _tracks_adapter.dump_python(tracks, mode="json")},
+            f,
+            Dumper=_YAMLDumper,
+            sort_keys=False,
+        )
     t2 = time.time()
     print(f"saving to yaml took {t2 - t1} seconds")
 
@@ -166,10 +185,9 @@ def dump_to_yaml(out_file: str, tracks: list[Track]):
 def load_from_yaml(file: str) -> list[Track]:
     with open(file, "r") as f:
         t1 = time.time()
-        doc = yaml.safe_load(f)
-        tracks = []
-        for t in doc["tracks"]:
-            tracks.append(Track(**t))
+        doc = yaml.load(f, Loader=_YAMLLoader)
+        # one call into pydantic-core for the whole list
+        tracks = _tracks_adapter.validate_python(doc["tracks"])
         t2 = time.time()
         print(f"load took {t2 - t1} seconds")
         return tracks
@@ -181,9 +199,38 @@ def shorten_string(s: str, maxlen: int) -> str:
     return s
 
 
+@lru_cache(maxsize=4096)
+def _parse_date(s: str) -> date:
+    """Date part of an ISO date or datetime string.
+
+    Tracks from the same release share their date string, so parses are cached.
+    """
+    return date.fromisoformat(s[:10])
+
+
+_NEXT_DATA_RE = re.compile(
+    rb'<script[^>]*\bid="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL
+)
+
+
+def _next_data_queries(html: bytes) -> list[dict]:
+    """The react-query cache embedded in a Beatport page's __NEXT_DATA__ script.
+
+    A regex over the raw page is enough to find the single script tag, so no
+    DOM is built and the page is never decoded to str; orjson parses the JSON
+    straight out of the response buffer.
+    """
+    m = _NEXT_DATA_RE.search(html)
+    if m is None:
+        return []
+    json_blob = orjson.loads(memoryview(html)[m.start(1) : m.end(1)])
+    return json_blob["props"]["pageProps"]["dehydratedState"]["queries"]
+
+
 async def bp_search_tracks(session: ClientSession, q: str) -> list[BPTrack]:
     logger.info(f"searching Beatport with query: {q}")
-    async with session.get(
+    html = await _get_page(
+        session,
         "https://www.beatport.com/search/tracks",
         params={
             "q": q,
@@ -191,39 +238,28 @@ async def bp_search_tracks(session: ClientSession, q: str) -> list[BPTrack]:
             "per_page": 1000,
             "page": 1,
         },
-    ) as response:
-        html = await response.text()
-        logger.debug(f"Beatport response: {html}")
-        soup = BeautifulSoup(html, "html.parser")
-        script_tags = soup.find_all("script")
-        tracks = []
-        for tag in script_tags:
-            if tag.get("id") == "__NEXT_DATA__":
-                for el in tag.contents:
-                    json_blob = json.loads(str(el))
-                    for query in json_blob["props"]["pageProps"]["dehydratedState"][
-                        "queries"
-                    ]:
-                        data = query.get("state", {}).get("data", {}).get("data", [])
-                        for item in data:
-                            artists = [x["artist_name"] for x in item["artists"]]
-                            bpt = BPTrack(
-                                artists,
-                                item.get("bpm"),
-                                item.get("key_name"),
-                                item.get("isrc"),
-                                label=item.get("label", {}).get("label_name"),
-                                release_date=datetime.fromisoformat(
-                                    item["release_date"]
-                                ).date(),
-                                track_id=item["track_id"],
-                                track_name=item["track_name"].strip(),
-                                mix_name=item["mix_name"].strip(),
-                                genre=[i["genre_name"].strip() for i in item["genre"]],
-                            )
-                            tracks.append(bpt)
-        logger.info(f"Beatport search results:\n{tracks}")
-        return tracks
+    )
+    logger.debug("Beatport response: %d bytes", len(html))
+    tracks = []
+    for query in _next_data_queries(html):
+        data = query.get("state", {}).get("data", {}).get("data", [])
+        for item in data:
+            artists = [x["artist_name"] for x in item["artists"]]
+            bpt = BPTrack(
+                artists,
+                item.get("bpm"),
+                item.get("key_name"),
+                item.get("isrc"),
+                label=item.get("label", {}).get("label_name"),
+                release_date=_parse_date(item["release_date"]),
+                track_id=item["track_id"],
+                track_name=item["track_name"].strip(),
+                mix_name=item["mix_name"].strip(),
+                genre=[i["genre_name"].strip() for i in item["genre"]],
+            )
+            tracks.append(bpt)
+    logger.info(f"Beatport search results:\n{tracks}")
+    return tracks
 
 
 def yt_select_best_match(
@@ -231,15 +267,19 @@ def yt_select_best_match(
 ) -> YTVideo | None:
     assert candidates
 
-    choices = [f"{r.title} - {artist}" for r in candidates]
+    # normalize (lower-case, strip punctuation) each string exactly once
+    artist = default_process(artist)
+    choices = [f"{default_process(r.title)} {artist}" for r in candidates]
 
-    best = thefuzz.process.extractOne(
-        title, choices, score_cutoff=50, scorer=thefuzz.fuzz.partial_token_sort_ratio
+    best = process.extractOne(
+        default_process(title),
+        choices,
+        scorer=fuzz.partial_token_sort_ratio,
+        score_cutoff=50,
     )
 
     if best:
-        i = choices.index(best[0])
-        return candidates[i]
+        return candidates[best[2]]
 
     return None
 
@@ -249,16 +289,17 @@ def mb_select_best_match(
 ) -> MBRecording | None:
     assert candidates
 
-    query = f"{title} - {artist}"
-    choices = [f"{r.title} - {','.join(r.artists)}" for r in candidates]
+    query = default_process(f"{title} - {artist}")
+    choices = [
+        default_process(f"{r.title} - {','.join(r.artists)}") for r in candidates
+    ]
 
-    best = thefuzz.process.extractOne(
-        query, choices, score_cutoff=50, scorer=thefuzz.fuzz.partial_token_sort_ratio
+    best = process.extractOne(
+        query, choices, scorer=fuzz.partial_token_sort_ratio, score_cutoff=50
     )
 
     if best:
-        i = choices.index(best[0])
-        return candidates[i]
+        return candidates[best[2]]
 
     return None
 
@@ -268,75 +309,106 @@ def bp_select_best_match(
 ) -> BPTrack | None:
     assert candidates
 
-    choices = [r.track_name for r in candidates]
+    choices = [default_process(r.track_name) for r in candidates]
 
-    best_title_match = thefuzz.process.extractOne(title, choices, score_cutoff=50)
+    best_title_match = process.extractOne(
+        default_process(title), choices, score_cutoff=50
+    )
 
-    i = None
-    if best_title_match:
-        i = choices.index(best_title_match[0])
+    if not best_title_match:
+        return None
 
-    choices = [",".join(r.artists) for r in candidates]
+    choices = [default_process(",".join(r.artists)) for r in candidates]
 
-    best_artist_match = thefuzz.process.extractOne(
-        artist, choices, score_cutoff=50, scorer=thefuzz.fuzz.partial_token_sort_ratio
+    best_artist_match = process.extractOne(
+        default_process(artist),
+        choices,
+        scorer=fuzz.partial_token_sort_ratio,
+        score_cutoff=50,
     )
 
-    j = None
     if best_artist_match:
-        j = choices.index(best_artist_match[0])
-
-    if i is not None and j is not None:
-        return candidates[i]
+        return candidates[best_title_match[2]]
 
     return None
 
 
+def _mb_parse_date(s: str | None) -> date | None:
+    """MusicBrainz dates may be partial ("2019", "2019-05"); those give None."""
+    if s is None:
+        return None
+    try:
+        return date.fromisoformat(s)
+    except ValueError:
+        return None
+
+
 async def mb_search_recording(query: str, session: ClientSession) -> list[MBRecording]:
     """example query: "love mythology AND artist:'henry saiz'"""
 
     logger.info(f"searching MusicBrainz with query: {query}")
 
-    async with session.get(
+    body = await _get_page(
+        session,
         "http://musicbrainz.org/ws/2/recording",
         params={"fmt": "json", "query": query},
-    ) as response:
-        data = await response.json()
-        logger.debug(f"MusicBrainz response: {data}")
-        # with open("dump.json", "w") as f:
-        #     json.dump(data, f)
-        recs = []
-        for rec in data.get("recordings", []):
-            id = rec.get("id")
-            title = rec.get("title")
-            release_date = None
-            if "first-release-date" in rec:
-                try:
-                    release_date = date.fromisoformat(rec["first-release-date"])
-                except ValueError:
-                    pass
-            artists = []
-            for a in rec.get("artist-credit", []):
-                name = a.get("name")
-                artists.append(name)
-            recs.append(MBRecording(title, id, artists, release_date))
-        logger.info(f"MusicBrainz search results:\n{recs}")
-        return recs
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"MusicBrainz response: {body!r}")
+    data = orjson.loads(body) if body else {}
+    # with open("dump.json", "w") as f:
+    #     json.dump(data, f)
+    recs = [
+        MBRecording(
+            rec.get("title"),
+            rec.get("id"),
+            [a.get("name") for a in rec.get("artist-credit", [])],
+            _mb_parse_date(rec.get("first-release-date")),
+        )
+        for rec in data.get("recordings", [])
+    ]
+    logger.info(f"MusicBrainz search results:\n{recs}")
+    return recs
+
+
+# client errors that won't go away by asking again
+_NON_RETRYABLE_STATUS = frozenset({400, 401, 403, 404})
 
 
 async def retry(f, n: int, label: str):
-    result = None
     backoff = 1.0
     for i in range(n):
         try:
-            result = await f()
-            return result
-        except Exception:
-            logger.exception(f"{label} failed: retry in {backoff} seconds...")
-            await asyncio.sleep(backoff)
+            return await f()
+        except Exception as ex:
+            if (
+                isinstance(ex, ClientResponseError)
+                and ex.status in _NON_RETRYABLE_STATUS
+            ):
+                raise
+            if i == n - 1:
+                logger.exception(f"{label} failed: giving up")
+                return None
+            # jitter, so that concurrent callers don't retry in lockstep
+            delay = backoff * (0.5 + random.random())
+            logger.exception(f"{label} failed: retry in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
             backoff *= 2
 
 
+async def _get_page(
+    session: ClientSession, url: str, params: dict | None = None
+) -> bytes:
+    """GET `url` with retries; an empty body if every attempt failed."""
+
+    async def get() -> bytes:
+        async with session.get(url, params=params) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    return await retry(get, 3, f"GET {url}") or b""
+
+
 def read_pl_from_csv(filepath: str) -> list[CsvRow]:
     with open(filepath, newline="") as csvfile:
         reader = csv.reader(csvfile, delimiter=",")
@@ -352,66 +424,50 @@ def read_pl_from_csv(filepath: str) -> list[CsvRow]:
 async def bp_search_labels(
     session: ClientSession, name: str, limit: int
 ) -> list[BPLabel]:
-    async with session.get(
+    html = await _get_page(
+        session,
         "https://www.beatport.com/search/labels",
         params={"q": name},
-    ) as response:
-        html = await response.text()
-        soup = BeautifulSoup(html, "html.parser")
-        script_tags = soup.find_all("script")
-        labels = []
-        for tag in script_tags:
-            if tag.get("id") == "__NEXT_DATA__":
-                for el in tag.contents:
-                    json_blob = json.loads(str(el))
-                    for query in json_blob["props"]["pageProps"]["dehydratedState"][
-                        "queries"
-                    ]:
-                        data = query.get("state", {}).get("data", {}).get("data", [])
-                        for item in data:
-                            labels.append(
-                                BPLabel(
-                                    item["label_name"].strip(),
-                                    item["label_name"].strip(),
-                                    item["label_id"],
-                                )
-                            )
-                            if len(labels) >= limit:
-                                return labels
-        return labels
+    )
+    labels = []
+    for query in _next_data_queries(html):
+        data = query.get("state", {}).get("data", {}).get("data", [])
+        for item in data:
+            labels.append(
+                BPLabel(
+                    item["label_name"].strip(),
+                    item["label_name"].strip(),
+                    item["label_id"],
+                )
+            )
+            if len(labels) >= limit:
+                return labels
+    return labels
 
 
 async def bp_search_artist(
     session: ClientSession, name: str, limit: int
 ) -> list[BPArtist]:
-    async with session.get(
+    html = await _get_page(
+        session,
         "https://www.beatport.com/search/artists",
         params={"q": name},
-    ) as response:
-        html = await response.text()
-        soup = BeautifulSoup(html, "html.parser")
-        script_tags = soup.find_all("script")
-        artists = []
-        for tag in script_tags:
-            if tag.get("id") == "__NEXT_DATA__":
-                for el in tag.contents:
-                    json_blob = json.loads(str(el))
-                    for query in json_blob["props"]["pageProps"]["dehydratedState"][
-                        "queries"
-                    ]:
-                        data = query.get("state", {}).get("data", {}).get("data", [])
-                        for item in data:
-                            artists.append(
-                                BPArtist(
-                                    item["artist_name"].strip(),
-                                    item["artist_name"].strip(),
-                                    item["artist_id"],
-                                    item["artist_image_uri"],
-                                )
-                            )
-                            if len(artists) >= limit:
-                                return artists
-        return artists
+    )
+    artists = []
+    for query in _next_data_queries(html):
+        data = query.get("state", {}).get("data", {}).get("data", [])
+        for item in data:
+            artists.append(
+                BPArtist(
+                    item["artist_name"].strip(),
+                    item["artist_name"].strip(),
+                    item["artist_id"],
+                    item["artist_image_uri"],
+                )
+            )
+            if len(artists) >= limit:
+                return artists
+    return artists
 
 
 async def bp_get_label_releases(
@@ -433,56 +489,44 @@ async def bp_get_label_releases(
         start_date = date(1990, 1, 1)
         params["publish_date"] = f"{start_date.isoformat()}:{end_date.isoformat()}"
 
-    async with session.get(
+    html = await _get_page(
+        session,
         f"https://www.beatport.com/label/{label.name}/{label.id}/tracks",
         params=params,
-    ) as response:
-        html = await response.text()
-        logger.debug(f"Beatport label release search response: {html}")
-        bp_tracks = []
-        soup = BeautifulSoup(html, "html.parser")
-        script_tags = soup.find_all("script")
-        for tag in script_tags:
-            if tag.get("id") == "__NEXT_DATA__":
-                for el in tag.contents:
-                    json_blob = json.loads(str(el))
-                    for query in json_blob["props"]["pageProps"]["dehydratedState"][
-                        "queries"
-                    ]:
-                        if "tracks" in query["queryKey"]:
-                            tracks = (
-                                query.get("state", {})
-                                .get("data", {})
-                                .get("results", [])
-                            )
-                            for track in tracks:
-                                artists = [a["name"].strip() for a in track["artists"]]
-                                track_name = track["name"].strip()
-                                mix_name = track["mix_name"].strip()
-                                isrc = track["isrc"].strip() if track["isrc"] else None
-                                key = track["key"]["name"].strip()
-                                release_date = date.fromisoformat(
-                                    track["new_release_date"]
-                                )
-                                bpm = track["bpm"]
-                                genre = track["genre"]["name"].strip()
-                                track_id = track["id"]
-                                label = track["release"]["label"]["name"].strip()
-                                bp_tracks.append(
-                                    BPTrack(
-                                        artists,
-                                        bpm,
-                                        key,
-                                        isrc,
-                                        label,
-                                        release_date,
-                                        track_id,
-                                        track_name,
-                                        mix_name,
-                                        [genre],
-                                    )
-                                )
-        return bp_tracks
+    )
+    logger.debug("Beatport label release search response: %d bytes", len(html))
+    bp_tracks = []
+    for query in _next_data_queries(html):
+        if "tracks" in query["queryKey"]:
+            tracks = query.get("state", {}).get("data", {}).get("results", [])
+            for track in tracks:
+                artists = [a["name"].strip() for a in track["artists"]]
+                track_name = track["name"].strip()
+                mix_name = track["mix_name"].strip()
+                isrc = track["isrc"].strip() if track["isrc"] else None
+                key = track["key"]["name"].strip()
+                release_date = _parse_date(track["new_release_date"])
+                bpm = track["bpm"]
+                genre = track["genre"]["name"].strip()
+                track_id = track["id"]
+                label = track["release"]["label"]["name"].strip()
+                bp_tracks.append(
+                    BPTrack(
+                        artists,
+                        bpm,
+                        key,
+                        isrc,
+                        label,
+                        release_date,
+                        track_id,
+                        track_name,
+                        mix_name,
+                        [genre],
+                    )
+                )
+            # only one query on the page holds the track listing
+            break
+    return bp_tracks
 
 
 async def bp_get_artist_releases(
@@ -504,56 +548,44 @@ async def bp_get_artist_releases(
         start_date = date(1990, 1, 1)
         params["publish_date"] = f"{start_date.isoformat()}:{end_date.isoformat()}"
 
-    async with session.get(
+    html = await _get_page(
+        session,
         f"https://www.beatport.com/artist/{artist.name}/{artist.id}/tracks",
         params=params,
-    ) as response:
-        html = await response.text()
-        logger.debug(f"Beatport label release search response: {html}")
-        bp_tracks = []
-        soup = BeautifulSoup(html, "html.parser")
-        script_tags = soup.find_all("script")
-        for tag in script_tags:
-            if tag.get("id") == "__NEXT_DATA__":
-                for el in tag.contents:
-                    json_blob = json.loads(str(el))
-                    for query in json_blob["props"]["pageProps"]["dehydratedState"][
-                        "queries"
-                    ]:
-                        if "tracks" in query["queryKey"]:
-                            tracks = (
-                                query.get("state", {})
-                                .get("data", {})
-                                .get("results", [])
-                            )
-                            for track in tracks:
-                                artists = [a["name"].strip() for a in track["artists"]]
-                                track_name = track["name"].strip()
-                                mix_name = track["mix_name"].strip()
-                                isrc = track["isrc"].strip()
-                                key = track["key"]["name"].strip()
-                                release_date = date.fromisoformat(
-                                    track["new_release_date"]
-                                )
-                                bpm = track["bpm"]
-                                genre = track["genre"]["name"].strip()
-                                track_id = track["id"]
-                                label = track["release"]["label"]["name"].strip()
-                                bp_tracks.append(
-                                    BPTrack(
-                                        artists,
-                                        bpm,
-                                        key,
-                                        isrc,
-                                        label,
-                                        release_date,
-                                        track_id,
-                                        track_name,
-                                        mix_name,
-                                        [genre],
-                                    )
-                                )
-        return bp_tracks
+    )
+    logger.debug("Beatport artist release search response: %d bytes", len(html))
+    bp_tracks = []
+    for query in _next_data_queries(html):
+        if "tracks" in query["queryKey"]:
+            tracks = query.get("state", {}).get("data", {}).get("results", [])
+            for track in tracks:
+                artists = [a["name"].strip() for a in track["artists"]]
+                track_name = track["name"].strip()
+                mix_name = track["mix_name"].strip()
+                isrc = track["isrc"].strip()
+                key = track["key"]["name"].strip()
+                release_date = _parse_date(track["new_release_date"])
+                bpm = track["bpm"]
+                genre = track["genre"]["name"].strip()
+                track_id = track["id"]
+                label = track["release"]["label"]["name"].strip()
+                bp_tracks.append(
+                    BPTrack(
+                        artists,
+                        bpm,
+                        key,
+                        isrc,
+                        label,
+                        release_date,
+                        track_id,
+                        track_name,
+                        mix_name,
+                        [genre],
+                    )
+                )
+            # only one query on the page holds the track listing
+            break
+    return bp_tracks
 
 
 async def bp_search_label_releases_fallback(
@@ -562,139 +594,140 @@ async def bp_search_label_releases_fallback(
     start_date: date,
     end_date: date = date.today(),
 ) -> list[BPTrack]:
-    async with session.get(
+    html = await _get_page(
+        session,
         f"https://www.beatport.com/label/{label.name}/{label.id}/tracks",
         params={
             "page": 1,
             "per_page": 1000,
             "publish_date": f"{start_date.isoformat()}:{end_date.isoformat()}",
         },
-    ) as response:
-        html = await response.text()
-        soup = BeautifulSoup(html, "html.parser")
-        elements = soup.select(".row.tracks-table")
-        tracks = []
-        for element in elements:
-            title_tag = element.select("div.title a")[0]
-            track_name = str(title_tag.attrs["title"])
-            track_id = int(str(title_tag.attrs["href"]).split("/")[-1])
-
-            title_strings = list(title_tag.stripped_strings)
-            # track_name = title_strings[0]
-            mix_name = title_strings[1]
-
-            artists = []
+    )
+    soup = BeautifulSoup(html, "lxml")
+    elements = soup.select(".row.tracks-table")
+    tracks = []
+    for element in elements:
+        title_tag = element.select("div.title a")[0]
+        track_name = str(title_tag.attrs["title"])
+        track_id = int(str(title_tag.attrs["href"]).split("/")[-1])
+
+        title_strings = list(title_tag.stripped_strings)
+        # track_name = title_strings[0]
+        mix_name = title_strings[1]
 
-            artist_tags = element.select("div.title a")[1:]
-            for tag in artist_tags:
-                artists.append(str(tag.attrs["title"]))
+        artists = []
 
-            label_tag = element.select("div.label a")[0]
-            label0 = str(label_tag.attrs["title"])
+        artist_tags = element.select("div.title a")[1:]
+        for tag in artist_tags:
+            artists.append(str(tag.attrs["title"]))
+
+        label_tag = element.select("div.label a")[0]
+        label0 = str(label_tag.attrs["title"])
+
+        # tracks = element.find_all(href=re.compile("^/track"))
+        # for track in tracks:
+        #     print(track["href"])
+
+        genre_tag = element.select("div.bpm > a")[0]
+        genre = str(genre_tag.attrs["title"])
+
+        bpm_tag = element.select("div.bpm > div")[0]
+        bpm = int(str(bpm_tag.contents[0]))
+        key = str(bpm_tag.contents[4]).strip("- ")
+
+        date_tag = element.select("div.date")[0]
+        release_date = _parse_date(date_tag.text)
+        track = BPTrack(
+            artists,
+            bpm,
+            key,
+            None,
+            label0,
+            release_date,
+            track_id,
+            track_name,
+            mix_name,
+            [genre],
+        )
+        tracks.append(track)
+    return tracks
 
-            # tracks = element.find_all(href=re.compile("^/track"))
-            # for track in tracks:
-            #     print(track["href"])
 
-            genre_tag = element.select("div.bpm > a")[0]
-            genre = str(genre_tag.attrs["title"])
+_YT_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Content-Type": "application/json",
+}
 
-            bpm_tag = element.select("div.bpm > div")[0]
-            bpm = int(str(bpm_tag.contents[0]))
-            key = str(bpm_tag.contents[4]).strip("- ")
+# tried in order until one returns results
+_YT_SEARCH_CLIENTS = [
+    ("WEB", "2.20240201.00.00"),
+    ("MWEB", "2.20240201.00.00"),
+    ("ANDROID", "19.09.37"),
+]
 
-            date_tag = element.select("div.date")[0]
-            release_date = date.fromisoformat(date_tag.text)
-            track = BPTrack(
-                artists,
-                bpm,
-                key,
-                None,
-                label0,
-                release_date,
-                track_id,
-                track_name,
-                mix_name,
-                [genre],
-            )
-            tracks.append(track)
-        return tracks
+_YT_SEARCH_CONTEXTS = [
+    {"client": {"clientName": name, "clientVersion": version}}
+    for name, version in _YT_SEARCH_CLIENTS
+]
 
 
-async def yt_search_simple(
-    session: ClientSession, query: str, limit: int
-) -> list[YTVideo]:
-    HEADERS = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Content-Type": "application/json",
-    }
+def _yt_get_text(runs):
+    return runs[0]["text"] if runs else ""
 
-    CLIENTS = [
-        ("WEB", "2.20240201.00.00"),
-        ("MWEB", "2.20240201.00.00"),
-        ("ANDROID", "19.09.37"),
-    ]
 
-    def _get_text(runs):
-        return runs[0]["text"] if runs else ""
+def _yt_extract_results(data: Any, limit: int) -> list[YTVideo]:
+    results = []
 
-    def _extract_results(data: Any, limit: int) -> list[YTVideo]:
-        results = []
+    sections = (
+        data.get("contents", {})
+        .get("twoColumnSearchResultsRenderer", {})
+        .get("primaryContents", {})
+        .get("sectionListRenderer", {})
+        .get("contents", [])
+    )
 
-        sections = (
-            data.get("contents", {})
-            .get("twoColumnSearchResultsRenderer", {})
-            .get("primaryContents", {})
-            .get("sectionListRenderer", {})
-            .get("contents", [])
-        )
+    for section in sections:
+        items = section.get("itemSectionRenderer", {}).get("contents", [])
+        for item in items:
+            video = item.get("videoRenderer")
+            if not video:
+                continue
 
-        for section in sections:
-            items = section.get("itemSectionRenderer", {}).get("contents", [])
-            for item in items:
-                video = item.get("videoRenderer")
-                if not video:
-                    continue
+            video_id = video.get("videoId")
+            title = _yt_get_text(video.get("title", {}).get("runs", []))
 
-                video_id = video.get("videoId")
-                title = _get_text(video.get("title", {}).get("runs", []))
+            channel = _yt_get_text(
+                video.get("ownerText", {}).get("runs", [])
+            ) or _yt_get_text(video.get("longBylineText", {}).get("runs", []))
 
-                channel = _get_text(
-                    video.get("ownerText", {}).get("runs", [])
-                ) or _get_text(video.get("longBylineText", {}).get("runs", []))
+            results.append(YTVideo(title, video_id, channel))
 
-                results.append(YTVideo(title, video_id, channel))
+            if len(results) >= limit:
+                return results
 
-                if len(results) >= limit:
-                    return results
+    return results
 
-        return results
 
+async def yt_search_simple(
+    session: ClientSession, query: str, limit: int
+) -> list[YTVideo]:
     # cycle through clients until first success
-    for name, version in CLIENTS:
+    for context in _YT_SEARCH_CONTEXTS:
         try:
             response = await session.post(
                 "https://www.youtube.com/youtubei/v1/search",
-                headers=HEADERS,
+                headers=_YT_HEADERS,
                 params={"key": "AIzaSyDummyKey"},
-                json={
-                    "context": {
-                        "client": {
-                            "clientName": name,
-                            "clientVersion": version,
-                        }
-                    },
-                    "query": query,
-                },
+                data=orjson.dumps({"context": context, "query": query}),
             )
 
-            data = await response.json()
+            data = orjson.loads(await response.read())
 
             # with open("dump.json", "w") as f:
             #     json.dump(data, f)
 
-            results = _extract_results(data, limit)
+            results = _yt_extract_results(data, limit)
             if results:
                 return results
 
@@ -706,12 +739,6 @@ async def yt_search_simple(
 
 # not super useful as it doesn't include music meta data
 async def yt_get_metadata(session: ClientSession, video_id: str):
-    HEADERS = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Content-Type": "application/json",
-    }
-
     CLIENTS = [
         ("WEB", "2.20240201.00.00"),
         ("ANDROID", "19.09.37"),
@@ -722,7 +749,7 @@ async def yt_get_metadata(session: ClientSession, video_id: str):
         try:
             response = await session.post(
                 "https://www.youtube.com/youtubei/v1/player",
-                headers=HEADERS,
+                headers=_YT_HEADERS,
                 params={"key": "AIzaSyDummyKey"},
                 json={
                     "context": {
@@ -735,7 +762,7 @@ async def yt_get_metadata(session: ClientSession, video_id: str):
                 },
             )
 
-            data = await response.json()
+            data = orjson.loads(await response.read())
 
             with open("dump.json", "w") as f:
                 json.dump(data, f)
@@ -748,16 +775,47 @@ async def yt_get_metadata(session: ClientSession, video_id: str):
     return []
 
 
+# concurrent YouTube searches per Beatport result list
+_YT_LOOKUP_CONCURRENCY = 10
+
+
+async def yt_lookup_bp_tracks(
+    session: ClientSession, tracks: list[BPTrack]
+) -> AsyncGenerator[Track]:
+    """Find a YouTube video for each Beatport track, searching concurrently.
+
+    Tracks are yielded in their original order; tracks without a match are
+    skipped. Searches still in flight are cancelled when the generator is
+    closed early.
+    """
+    sem = asyncio.Semaphore(_YT_LOOKUP_CONCURRENCY)
+
+    async def lookup(track: BPTrack) -> list[YTVideo]:
+        q = f"{track.track_name} {', '.join(track.artists)} {track.label}"
+        async with sem:
+            return await yt_search_simple(session, q, 1)
+
+    tasks = [asyncio.create_task(lookup(track)) for track in tracks]
+    try:
+        for track, task in zip(tracks, tasks):
+            yt_vids = await task
+            if yt_vids:
+                yield Track.from_bp_track(track, yt_vids[0].id)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 async def get_label_releases(
     session: ClientSession, label_name: str, start_date: date | None = None
 ) -> AsyncGenerator[Track]:
     bp_labels = await bp_search_labels(session, label_name, limit=1)
     if bp_labels:
         tracks = await bp_get_label_releases(session, bp_labels[0], start_date)
-        for track in tracks:
-            q = f"{track.track_name} {', '.join(track.artists)} {track.label}"
-            yt_vids = await yt_search_simple(session, q, 1)
-            yield Track.from_bp_track(track, yt_vids[0].id)
+        async with aclosing(yt_lookup_bp_tracks(session, tracks)) as results:
+            async for track in results:
+                yield track
 
 
 async def get_artist_releases(
@@ -766,31 +824,85 @@ async def get_artist_releases(
     bp_artists = await bp_search_artist(session, artist_name, limit=1)
     if bp_artists:
         tracks = await bp_get_artist_releases(session, bp_artists[0], start_date)
-        for track in tracks:
-            q = f"{track.track_name} {', '.join(track.artists)} {track.label}"
-            yt_vids = await yt_search_simple(session, q, 1)
-            yield Track.from_bp_track(track, yt_vids[0].id)
+        async with aclosing(yt_lookup_bp_tracks(session, tracks)) as results:
+            async for track in results:
+                yield track
 
 
 async def search_fuzzy(session: ClientSession, query: str) -> AsyncGenerator[Track]:
     bp_tracks = await bp_search_tracks(session, query)
-    for track in bp_tracks:
-        q = f"{track.track_name} {', '.join(track.artists)} {track.label}"
-        yt_vids = await yt_search_simple(session, q, 1)
-        if yt_vids:
-            yield Track.from_bp_track(track, yt_vids[0].id)
+    async with aclosing(yt_lookup_bp_tracks(session, bp_tracks)) as results:
+        async for track in results:
+            yield track
 
 
-async def get_final_url(url):
-    async with ClientSession() as session:
-        async with session.get(url, allow_redirects=True) as response:
-            return response.url
+# how long scraped search results and API responses are served from the cache
+_HTTP_CACHE_EXPIRE_AFTER = timedelta(days=1)
+
+
+def create_session(cache_path: Path | None = None) -> ClientSession:
+    """HTTP session meant to be shared across requests, so that connections
+    to Beatport, YouTube etc. are kept alive and reused.
+
+    With `cache_path`, successful GET and HEAD responses are cached in an
+    SQLite file.
+    """
+    kwargs: dict[str, Any] = dict(
+        # a few hosts take all the traffic: keep a bounded set of warm
+        # connections per host and hold them across pauses between searches
+        connector=TCPConnector(
+            limit=50, limit_per_host=20, keepalive_timeout=60, ttl_dns_cache=300
+        ),
+        timeout=ClientTimeout(total=30),
+    )
+    if cache_path is None:
+        return ClientSession(**kwargs)
+
+    cache = SQLiteBackend(
+        str(cache_path),
+        expire_after=_HTTP_CACHE_EXPIRE_AFTER,
+        allowed_methods=("GET", "HEAD"),
+    )
+    return CachedSession(cache=cache, **kwargs)
+
+
+async def delete_expired_responses(session: ClientSession) -> None:
+    """Drop expired entries from the session's HTTP cache, if it has one.
+
+    An expired response is otherwise only replaced when the same request is
+    made again, so the cache file would keep growing.
+    """
+    if isinstance(session, CachedSession):
+        try:
+            await session.delete_expired_responses()
+        except Exception:
+            logger.warning("failed to purge the HTTP cache", exc_info=True)
+
+
+async def get_final_url(url, session: ClientSession | None = None):
+    if session is None:
+        async with create_session() as session:
+            return await get_final_url(url, session)
+
+    # each call is supposed to create a new (anonymous) playlist, so bypass
+    # the cache; disabling it on the shared session would affect every other
+    # request running meanwhile, so go through its connection pool instead
+    if isinstance(session, CachedSession):
+        async with ClientSession(
+            connector=session.connector, connector_owner=False, timeout=session.timeout
+        ) as uncached:
+            return await get_final_url(url, uncached)
+
+    async with session.get(url, allow_redirects=True) as response:
+        return response.url
 
 
-async def yt_create_anon_playlist(video_ids: list[str]) -> str:
+async def yt_create_anon_playlist(
+    video_ids: list[str], session: ClientSession | None = None
+) -> str:
     base_url = "http://www.youtube.com/watch_videos?video_ids="
     url = f"{base_url}{','.join(video_ids)}"
-    final_url = await get_final_url(url)
+    final_url = await get_final_url(url, session)
     list = final_url.query.get("list")
     return f"https://music.youtube.com/watch?list={list}"
 
@@ -816,7 +928,7 @@ async def txs_search(query: str) -> list[TXSTrack]:
 
         tracks = []
 
-        soup = BeautifulSoup(html, "html.parser")
+        soup = BeautifulSoup(html, "lxml")
         rows = soup.select(".trk-row")
         for row in rows:
             artists = [
@@ -852,48 +964,48 @@ async def txs_search(query: str) -> list[TXSTrack]:
 if __name__ == "__main__":
 
     async def test_yt_search():
-        async with ClientSession() as session:
+        async with create_session() as session:
             vids = await yt_search_simple(session, "walls mosoo deco", 3)
             print(vids)
 
     async def test_yt_get_metadata():
-        async with ClientSession() as session:
+        async with create_session() as session:
             md = await yt_get_metadata(session, "ieLNrlLUhWo")
             print(md)
 
     async def test_get_label_releases():
-        async with ClientSession() as session:
+        async with create_session() as session:
             async for track in get_label_releases(
                 session, "Magnifik Music", date(2025, 1, 1)
             ):
                 print(track)
 
     async def test_get_artist_releases():
-        async with ClientSession() as session:
+        async with create_session() as session:
             async for track in get_artist_releases(
                 session, "kadosh ofc", date(2025, 1, 1)
             ):
                 print(track)
 
     async def test_mb_search():
-        async with ClientSession() as session:
+        async with create_session() as session:
             tracks = await mb_search_recording(
                 'recording:"houdini" AND artist:"dua lipa"', session
             )
             print(tracks)
 
     async def test_bp_search():
-        async with ClientSession() as session:
+        async with create_session() as session:
             tracks = await bp_search_tracks(session, "kadosh")
             print(tracks)
 
     async def test_bp_search_artist():
-        async with ClientSession() as session:
+        async with create_session() as session:
             artist = await bp_search_artist(session, "kadosh", 10)
             print(artist[:5])
 
     async def test_search_fuzzy():
-        async with ClientSession() as session:
+        async with create_session() as session:
             query = "auguxt what that means"
             # query = "henry saiz love mythology"
             i = 0
@@ -905,8 +1017,9 @@ if __name__ == "__main__":
 
     async def test_yt_anon_playlist():
         ids = ["nP60jajfMdw", "0h6VHeysvh4", "tDDsbq8PqBM"]
-        url = await yt_create_anon_playlist(ids)
-        print(url)
+        async with create_session() as session:
+            url = await yt_create_anon_playlist(ids, session)
+            print(url)
 
     async def test_txs_search():
         tracks = await txs_search("juno ride with me")
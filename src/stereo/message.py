@@ -4,7 +4,7 @@ from typing import Any, Literal
 from stereo.lib import Collection, Track
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgCollectionInfo:
     id: int | None = None
     collection: Collection | None = None
@@ -13,107 +13,107 @@ class MsgCollectionInfo:
     type: Literal["collection-info"] = "collection-info"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgDefaultCollection:
     collection: Collection
     type: Literal["default-collection"] = "default-collection"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgCreateYTAnonPlaylist:
     id: int
     yt_ids: list[str]
     type: Literal["create-yt-anon-playlist"] = "create-yt-anon-playlist"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgYTAnonPlaylist:
     id: int
     url: str
     type: Literal["yt-anon-playlist"] = "yt-anon-playlist"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgUpdateTrack:
     old: Track
     new: Track
     type: Literal["update-track"] = "update-track"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgHeartbeat:
     timestamp: int
     type: Literal["heartbeat"] = "heartbeat"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgImportFrom:
     path: str
     keep_user_data: bool
     type: Literal["import-from"] = "import-from"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgCheckImportFrom:
     path: str
     type: Literal["check-import-from"] = "check-import-from"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgImportFromValid:
     path: str
     is_valid: bool
     type: Literal["import-from-valid"] = "import-from-valid"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgBackendInfo:
     version: str
     type: Literal["backend-info"] = "backend-info"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgCollectionContainsId:
     id: int  # request id
     yt_id: str
     type: Literal["collection-contains-id"] = "collection-contains-id"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgCollectionContainsIdResponse:
     id: int  # request id
     contains_id: bool
     type: Literal["collection-contains-id-response"] = "collection-contains-id-response"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgDeleteTracks:
     ids: list[str]
     type: Literal["delete-tracks"] = "delete-tracks"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgExportTracksToCollection:
     tracks: list[Track]
     collection: str
     type: Literal["export-tracks-to-collection"] = "export-tracks-to-collection"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgValidateTrack:
     id: int  # request id
     track: dict[str, Any]
     type: Literal["validate-track"] = "validate-track"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgValidateTrackReply:
     id: int  # request id
     is_valid: bool
     type: Literal["validate-track-reply"] = "validate-track-reply"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgSearch:
     query: str
     query_id: int
@@ -122,73 +122,73 @@ class MsgSearch:
     type: Literal["search"] = "search"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgSearchCancelAll:
     type: Literal["search-cancel-all"] = "search-cancel-all"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgSearchResults:
     query_id: int
     tracks: list[Track]
     type: Literal["search-results"] = "search-results"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgSearchResult:
     query_id: int
     track: Track
     type: Literal["search-result"] = "search-result"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgSearchComplete:
     query_id: int
     type: Literal["search-complete"] = "search-complete"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgSetCollection:
     id: int  # request id
     path: str
     type: Literal["set-collection"] = "set-collection"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgCreateCollection:
     path: str
     type: Literal["create-collection"] = "create-collection"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgAddTrack:
     track: Track
     overwrite_existing: bool = False
     type: Literal["add-track"] = "add-track"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgAddTracks:
     tracks: list[Track]
     overwrite_existing: bool = False
     type: Literal["add-tracks"] = "add-tracks"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgGetPathCompletions:
     id: int  # request id
     path_prefix: str
     type: Literal["get-path-completions"] = "get-path-completions"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgPathCompletions:
     id: int  # request id
     paths: list[str]
     type: Literal["path-completions"] = "path-completions"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgRows:
     id: int  # request id
     rows: list[Track]
@@ -196,38 +196,38 @@ class MsgRows:
     type: Literal["rows"] = "rows"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgTrackUpdate:
     track: Track
     type: Literal["track-update"] = "track-update"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgReloadTracks:
     type: Literal["reload-tracks"] = "reload-tracks"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgUpdateRating:
     yt_id: str
     rating: int | None
     type: Literal["update-rating"] = "update-rating"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgIncPlayCount:
     yt_id: str
     type: Literal["inc-play-count"] = "inc-play-count"
 
 
-@dataclass
+@dataclass(slots=True)
 class SortModelItem:
     colId: str
     sort: str
     type: str | None
 
 
-@dataclass
+@dataclass(slots=True)
 class FilterModelItem:
     filterType: str
     type: str
@@ -237,14 +237,14 @@ class FilterModelItem:
     dateTo: str | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CombinedFilterModelItem:
     filterType: str
     operator: str  # 'AND' or 'OR'
     conditions: list[FilterModelItem]
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgGetRows:
     id: int
     startRow: int
@@ -256,7 +256,7 @@ class MsgGetRows:
     type: Literal["get-rows"] = "get-rows"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgGetRowIndex:
     id: int
     yt_id: str
@@ -267,26 +267,26 @@ class MsgGetRowIndex:
     type: Literal["get-row-index"] = "get-row-index"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgRowIndex:
     id: int
     index: int
     type: Literal["row-index"] = "row-index"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgGetTrackInfo:
     yt_id: str
     type: Literal["get-track-info"] = "get-track-info"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgTrackInfo:
     track: Track
     type: Literal["track-info"] = "track-info"
 
 
-@dataclass
+@dataclass(slots=True)
 class MsgNotification:
     message: str
     kind: Literal["info", "warn", "warning", "error"]
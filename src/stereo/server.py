@@ -1,17 +1,15 @@
 import asyncio
-import json
 import logging
 import uuid
 from asyncio import Event, Queue
-from contextlib import asynccontextmanager
-from dataclasses import asdict, dataclass
-from datetime import date, datetime
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Literal
+from typing import Annotated, AsyncIterator, Literal, get_args
 
 import aiohttp
 from anyio import TemporaryDirectory
-from pydantic import TypeAdapter, ValidationError
+from pydantic import Field, TypeAdapter, ValidationError
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from starlette.applications import Starlette
 from starlette.routing import Mount, WebSocketRoute
@@ -54,6 +52,7 @@ from stereo.message import (
     MsgSearchCancelAll,
     MsgSearchComplete,
     MsgSearchResult,
+    MsgSearchResults,
     MsgServer,
     MsgSetCollection,
     MsgTrackInfo,
@@ -64,18 +63,12 @@ from stereo.message import (
     MsgValidateTrackReply,
     MsgYTAnonPlaylist,
 )
-from stereo.utils import download_file, get_path_completions, is_file_or_url
-
-
-class JsonEnc(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, (datetime, date)):
-            return o.isoformat()
-        if isinstance(o, Track):
-            return o.model_dump()
-        if isinstance(o, Path):
-            return str(o)
-        return super().default(o)
+from stereo.utils import (
+    clear_path_completions_cache,
+    download_file,
+    get_path_completions_async,
+    is_file_or_url,
+)
 
 
 class Settings(BaseSettings):
@@ -90,53 +83,202 @@ class Settings(BaseSettings):
 class SessionState:
     collection: Collection | None = None
     search_task: asyncio.Task[None] | None = None
+    _ctx: db.Context | None = None
 
     def db_ctx(self) -> db.Context | None:
-        if self.collection is not None:
-            return db.Context(self.collection.path)
-        else:
+        if self.collection is None:
             return None
+        if self._ctx is None or self._ctx.path != self.collection.path:
+            self._ctx = db.Context(self.collection.path)
+        return self._ctx
+
+    async def set_collection(self, collection: Collection | None) -> None:
+        # the session keeps its collection's pool open, see db.retain
+        old, self.collection = self.collection, collection
+        if collection is not None:
+            db.retain(collection.path)
+        if old is not None:
+            await db.release(old.path)
+
+
+@dataclass(slots=True)
+class _Latest:
+    """Queue entry for a coalesced update; newer updates replace `msg`."""
+
+    msg: MsgServer
+
+
+class TxQueue:
+    """Send queue with two lanes: replies and notifications go in a control
+    lane that is always served first, so they don't wait behind large pages
+    of tracks in the ordered lane.
+
+    State updates that only matter in their latest version (reload requests,
+    unsolicited collection info) go in the ordered lane, behind any rows
+    queued before them, so the client never applies those rows after the
+    reload. As long as no rows have been queued behind such an update, a
+    newer one of the same kind takes its place instead of queueing up too.
+    """
+
+    BULK = (MsgRows, MsgSearchResults)
+
+    def __init__(self, maxsize: int = 0):
+        self._ctrl: Queue[MsgServer | bytes] = Queue(maxsize)
+        self._ordered: Queue[MsgServer | bytes | _Latest] = Queue(maxsize)
+        self._nonempty = Event()
+        # coalescable updates with nothing queued behind them, by type
+        self._open: dict[type, _Latest] = {}
+        self._is_shutdown = False
+
+    @staticmethod
+    def _coalesces(item) -> bool:
+        return isinstance(item, MsgReloadTracks) or (
+            isinstance(item, MsgCollectionInfo) and item.id is None
+        )
+
+    def _coalesce(self, item) -> bool:
+        if self._is_shutdown or not self._coalesces(item):
+            return False
+        if (latest := self._open.get(type(item))) is None:
+            return False
+        latest.msg = item
+        return True
+
+    def _lane(self, item) -> Queue:
+        if isinstance(item, self.BULK) or self._coalesces(item):
+            return self._ordered
+        return self._ctrl
+
+    def _wrap(self, item):
+        if self._coalesces(item):
+            return _Latest(item)
+        return item
+
+    def _enqueued(self, entry) -> None:
+        if isinstance(entry, _Latest):
+            self._open[type(entry.msg)] = entry
+        elif isinstance(entry, self.BULK):
+            self._open.clear()
+        self._nonempty.set()
+
+    async def put(self, item: MsgServer | bytes) -> None:
+        if not self._coalesce(item):
+            entry = self._wrap(item)
+            await self._lane(item).put(entry)
+            self._enqueued(entry)
+
+    def put_nowait(self, item: MsgServer | bytes) -> None:
+        if not self._coalesce(item):
+            entry = self._wrap(item)
+            self._lane(item).put_nowait(entry)
+            self._enqueued(entry)
+
+    def get_nowait(self) -> MsgServer | bytes:
+        if not self._ctrl.empty():
+            return self._ctrl.get_nowait()
+        if self._ordered.empty():
+            if self._is_shutdown:
+                raise asyncio.QueueShutDown
+            raise asyncio.QueueEmpty
+        entry = self._ordered.get_nowait()
+        if isinstance(entry, _Latest):
+            if self._open.get(type(entry.msg)) is entry:
+                del self._open[type(entry.msg)]
+            return entry.msg
+        return entry
+
+    async def get(self) -> MsgServer | bytes:
+        while True:
+            try:
+                return self.get_nowait()
+            except asyncio.QueueEmpty:
+                self._nonempty.clear()
+                await self._nonempty.wait()
+
+    def qsize(self) -> int:
+        return self._ctrl.qsize() + self._ordered.qsize()
+
+    def empty(self) -> bool:
+        return self._ctrl.empty() and self._ordered.empty()
+
+    def full(self) -> bool:
+        return self._ctrl.full() or self._ordered.full()
 
+    def shutdown(self) -> None:
+        """Drop what is queued and make blocked or later puts and gets raise
+        `asyncio.QueueShutDown`."""
+        self._is_shutdown = True
+        self._open.clear()
+        self._ctrl.shutdown(immediate=True)
+        self._ordered.shutdown(immediate=True)
+        self._nonempty.set()
 
-qs_tx: dict[str, Queue[MsgServer]] = {}  # WS send queues
-qs_rx: dict[str, Queue[MsgClient]] = {}  # WS receive queues
 
 settings = Settings()
 
 logger = logging.getLogger(__name__)
 
-client_msg_adapter = TypeAdapter(MsgClient)
+# dispatch on the `type` tag instead of trying every member of the union
+client_msg_adapter = TypeAdapter(
+    Annotated[MsgClient.__value__, Field(discriminator="type")]
+)
 
 
 def decode_client_msg(msg: str) -> MsgClient:
     return client_msg_adapter.validate_json(msg)
 
 
-async def ws_broadcast(msg: MsgServer):
-    for _, q in qs_tx.items():
-        await q.put(msg)
+# one serializer per message class, built up front: encoding a message is a
+# dict lookup on its type rather than a walk through the MsgServer union
+server_msg_adapters = {cls: TypeAdapter(cls) for cls in get_args(MsgServer.__value__)}
+
+
+def encode_server_msg(msg: MsgServer) -> bytes:
+    return server_msg_adapters[type(msg)].dump_json(msg)
+
+
+# e.g. the 10000-row fetch behind exports takes ~15 ms to encode
+_THREADED_ENCODE_MIN_TRACKS = 1000
+
+
+async def encode_server_msg_async(msg: MsgServer | bytes) -> bytes:
+    """Like `encode_server_msg`, but large track lists are encoded in a worker
+    thread so the event loop can keep serving other connections meanwhile."""
+    match msg:
+        case bytes():
+            return msg
+        case MsgRows(rows=tracks) | MsgSearchResults(tracks=tracks) if (
+            len(tracks) >= _THREADED_ENCODE_MIN_TRACKS
+        ):
+            return await asyncio.to_thread(encode_server_msg, msg)
+    return encode_server_msg(msg)
+
+
+# what encode_server_msgs([encode_server_msg(MsgHeartbeat(t))]) gives
+_HEARTBEAT_FRAME = '[{"timestamp":%d,"type":"heartbeat"}]'
+
+
+def encode_server_msgs(encoded: list[bytes]) -> str:
+    return (b"[" + b",".join(encoded) + b"]").decode()
 
 
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     uid = str(uuid.uuid4())
 
-    q_tx: Queue[MsgServer] = asyncio.Queue(10000)
+    # producers may hand over messages already encoded (see search_fuzzy)
+    q_tx = TxQueue(256)
     q_rx: Queue[MsgClient] = asyncio.Queue(10000)
 
-    qs_tx[uid] = q_tx
-    qs_rx[uid] = q_rx
-
-    default_collection_path = settings.home / "stereo.db"
-
-    await db.init_db(db.Context(default_collection_path))
+    # shared by all connections, see lifespan
+    http_session: aiohttp.ClientSession = websocket.state.http_session
 
+    # created in lifespan; the count is served from the pool's cache
+    default_collection_path = websocket.state.default_collection_path
     n = await db.count_rows(db.Context(default_collection_path), {})
 
     default_collection = Collection(default_collection_path, n)
 
-    ev_state_change = Event()
-
     state = SessionState()
 
     logger.info(f"Opening new WS connection: {uid}")
@@ -146,53 +288,64 @@ async def websocket_endpoint(websocket: WebSocket):
     ) -> None:
         await q_tx.put(MsgNotification(msg, kind))
 
-    async def search_fuzzy(query: str, query_id: int, limit: int):
-        async with aiohttp.ClientSession() as session:
+    async def send_search_results(
+        tracks: AsyncIterator[Track], query_id: int, limit: int
+    ) -> None:
+        # never block the search on a full send queue: results that arrive
+        # meanwhile go out together as one MsgSearchResults once there is room
+        # (encoded here so they stay in order with MsgSearchComplete)
+        backlog: list[Track] = []
+        try:
             i = 0
-            try:
-                async for track in lib.search_fuzzy(session, query):
-                    await q_tx.put(MsgSearchResult(query_id, track))
-                    i += 1
-                    if i >= limit:
-                        break
-            except Exception as ex:
-                logger.exception("search_fuzzy failed")
-                await notify_client(f"Search failed with exception: {ex}", "error")
+            async for track in tracks:
+                backlog.append(track)
+                if not q_tx.full():
+                    msg = (
+                        MsgSearchResult(query_id, track)
+                        if len(backlog) == 1
+                        else MsgSearchResults(query_id, backlog)
+                    )
+                    q_tx.put_nowait(encode_server_msg(msg))
+                    backlog = []
+                i += 1
+                if i >= limit:
+                    break
+        finally:
+            if backlog:
+                await q_tx.put(encode_server_msg(MsgSearchResults(query_id, backlog)))
 
-            finally:
-                await q_tx.put(MsgSearchComplete(query_id))
+    async def search_fuzzy(query: str, query_id: int, limit: int):
+        try:
+            async with aclosing(lib.search_fuzzy(http_session, query)) as tracks:
+                await send_search_results(tracks, query_id, limit)
+        except Exception as ex:
+            logger.exception("search_fuzzy failed")
+            await notify_client(f"Search failed with exception: {ex}", "error")
+
+        finally:
+            await q_tx.put(MsgSearchComplete(query_id))
 
     async def search_by_artist(query: str, query_id: int, limit: int):
-        async with aiohttp.ClientSession() as session:
-            i = 0
-            try:
-                async for track in lib.get_artist_releases(session, query):
-                    await q_tx.put(MsgSearchResult(query_id, track))
-                    i += 1
-                    if i >= limit:
-                        break
-            except Exception as ex:
-                logger.exception("search_by_artist failed")
-                await notify_client(f"Search failed with exception: {ex}", "error")
+        try:
+            async with aclosing(lib.get_artist_releases(http_session, query)) as tracks:
+                await send_search_results(tracks, query_id, limit)
+        except Exception as ex:
+            logger.exception("search_by_artist failed")
+            await notify_client(f"Search failed with exception: {ex}", "error")
 
-            finally:
-                await q_tx.put(MsgSearchComplete(query_id))
+        finally:
+            await q_tx.put(MsgSearchComplete(query_id))
 
     async def search_by_label(query: str, query_id: int, limit: int):
-        async with aiohttp.ClientSession() as session:
-            i = 0
-            try:
-                async for track in lib.get_label_releases(session, query):
-                    await q_tx.put(MsgSearchResult(query_id, track))
-                    i += 1
-                    if i >= limit:
-                        break
-            except Exception as ex:
-                logger.exception("search_by_label failed")
-                await notify_client(f"Search failed with exception: {ex}", "error")
+        try:
+            async with aclosing(lib.get_label_releases(http_session, query)) as tracks:
+                await send_search_results(tracks, query_id, limit)
+        except Exception as ex:
+            logger.exception("search_by_label failed")
+            await notify_client(f"Search failed with exception: {ex}", "error")
 
-            finally:
-                await q_tx.put(MsgSearchComplete(query_id))
+        finally:
+            await q_tx.put(MsgSearchComplete(query_id))
 
     async def update_collection() -> None:
         if state.collection is not None:
@@ -200,12 +353,13 @@ async def websocket_endpoint(websocket: WebSocket):
             n = await db.count_rows(db.Context(Path(path)), {})
             state.collection.size = n
             await q_tx.put(MsgCollectionInfo(collection=state.collection))
-            ev_state_change.set()
 
     async def handle_client_msg(msg: MsgClient):
         match msg:
             case MsgHeartbeat(t):
-                await q_tx.put(MsgHeartbeat(t))
+                # pure echo: skip the send queue and the encoder (a frame is
+                # a list of messages, see send_loop)
+                await websocket.send_text(_HEARTBEAT_FRAME % t)
 
             case MsgValidateTrack(id, data):
                 try:
@@ -226,9 +380,11 @@ async def websocket_endpoint(websocket: WebSocket):
                     path = Path(collection)
                     is_valid = await db.validate_db_schema(path)
                     if is_valid:
-                        ctx = db.Context(path)
                         try:
-                            await db.insert_tracks(ctx, tracks, ignore_existing=False)
+                            async with db.using(path) as ctx:
+                                await db.insert_tracks(
+                                    ctx, tracks, ignore_existing=False
+                                )
                         except Exception as ex:
                             await notify_client(
                                 f"Export failed: exception occurred while inserting tracks into {collection}: {ex}",
@@ -246,7 +402,7 @@ async def websocket_endpoint(websocket: WebSocket):
                         )
 
             case MsgCreateYTAnonPlaylist(id, ids):
-                url = await lib.yt_create_anon_playlist(ids)
+                url = await lib.yt_create_anon_playlist(ids, http_session)
                 await q_tx.put(MsgYTAnonPlaylist(id, url))
 
             case MsgUpdateTrack(old, new):
@@ -289,19 +445,15 @@ async def websocket_endpoint(websocket: WebSocket):
             case MsgUpdateRating(yt_id, rating):
                 ctx = state.db_ctx()
                 if ctx is not None:
-                    await db.update_track(ctx, yt_id, {"rating": rating})
-                    track = await db.get_track(ctx, yt_id)
+                    track = await db.update_track(ctx, yt_id, {"rating": rating})
                     if track is not None:
                         await q_tx.put(MsgTrackUpdate(track))
 
             case MsgIncPlayCount(yt_id):
                 ctx = state.db_ctx()
                 if ctx is not None:
-                    track = await db.get_track(ctx, yt_id)
+                    track = await db.increment_play_count(ctx, yt_id)
                     if track is not None:
-                        track.play_count += 1
-                        track.last_played = datetime.now().date()
-                        await db.insert_track(ctx, track, ignore_if_exists=False)
                         await q_tx.put(MsgTrackUpdate(track))
 
             case MsgGetRows(id, start_row, end_row, sort_model, filter_model):
@@ -354,22 +506,24 @@ async def websocket_endpoint(websocket: WebSocket):
                     return
 
                 path.parent.mkdir(parents=True, exist_ok=True)
-                await db.init_db(db.Context(path))
-                col = Collection(path, 0)
-                state.collection = col
+                async with db.using(path) as ctx:
+                    await db.init_db(ctx)
+                    await state.set_collection(Collection(path, 0))
+                clear_path_completions_cache()
                 await q_tx.put(MsgCollectionInfo(collection=state.collection))
-                ev_state_change.set()
 
             case MsgSetCollection(id, path):
                 is_valid = await db.validate_db_schema(path)
                 if is_valid:
-                    n = await db.count_rows(db.Context(Path(path)), {})
-                    col = Collection(Path(path), n)
-                    state.collection = col
+                    async with db.using(path) as ctx:
+                        # bring older collections up to the current schema (indexes etc.)
+                        await db.init_db(ctx)
+                        n = await db.count_rows(ctx, {})
+                        await state.set_collection(Collection(Path(path), n))
                     await q_tx.put(MsgCollectionInfo(id, state.collection))
                 else:
-                    state.collection = None
-                    completions = get_path_completions(path)
+                    await state.set_collection(None)
+                    completions = await get_path_completions_async(path)
                     await q_tx.put(
                         MsgCollectionInfo(
                             id,
@@ -377,10 +531,9 @@ async def websocket_endpoint(websocket: WebSocket):
                             path_completions=completions,
                         )
                     )
-                ev_state_change.set()
 
             case MsgGetPathCompletions(id, prefix):
-                completions = get_path_completions(prefix)
+                completions = await get_path_completions_async(prefix)
                 await q_tx.put(MsgPathCompletions(id, completions))
 
             case MsgImportFrom(path, keep_user_data):
@@ -402,7 +555,9 @@ async def websocket_endpoint(websocket: WebSocket):
                         async with TemporaryDirectory() as tmp_dir:
                             db_path = Path(tmp_dir) / "temp-collection.db"
                             try:
-                                await download_file(path, db_path)
+                                await download_file(
+                                    path, db_path, http_session.connector
+                                )
                             except Exception as ex:
                                 await notify_client(
                                     f"Downloading collection from {path} failed: {ex}",
@@ -439,7 +594,9 @@ async def websocket_endpoint(websocket: WebSocket):
                         async with TemporaryDirectory() as tmp_dir:
                             db_path = Path(tmp_dir) / "temp-collection.db"
                             try:
-                                await download_file(path, db_path)
+                                await download_file(
+                                    path, db_path, http_session.connector
+                                )
                             except Exception:
                                 logger.exception(f"failed to download from {path}")
                                 await q_tx.put(MsgImportFromValid(path, False))
@@ -452,41 +609,55 @@ async def websocket_endpoint(websocket: WebSocket):
             case _:
                 logger.warning(f"unhandled WS message: {msg}")
 
-    async def handle_state_changes_loop():
+    # send in chunks of roughly `max_chunk_bytes` (a search result is ~300 bytes,
+    # heartbeats a few dozen bytes) with a maximum delay (in seconds)
+    async def send_loop(max_chunk_bytes: int, max_delay: float):
+        loop = asyncio.get_running_loop()
+        buffer: list[bytes] = []
         while True:
-            # state_prev = copy.deepcopy(state)
-            await ev_state_change.wait()
-
-            ev_state_change.clear()
-            await asyncio.sleep(0.1)  # debounce
-
-    # send in chunks with a maximum delay (in seconds)
-    async def send_loop(max_chunk_size: int, max_delay: float):
-        buffer = []
-        timeout = False
-        while True:
-            try:
-                msg = await asyncio.wait_for(q_tx.get(), max_delay)
-                buffer.append(asdict(msg))
-                q_tx.task_done()
-            except TimeoutError:
-                timeout = True
-            if len(buffer) >= max_chunk_size or (timeout and buffer):
-                text = json.dumps(buffer, cls=JsonEnc)
-                logger.info(f"sending WS message: {text[:500]}...")
+            # idle connections just wait here; the delay starts with the first
+            # message of a chunk, so there is one timer per chunk, not per
+            # message, and a steady trickle can't hold a chunk back forever
+            msg = await q_tx.get()
+            deadline = loop.time() + max_delay
+            buffer_bytes = 0
+            while True:
+                try:
+                    encoded = await encode_server_msg_async(msg)
+                except Exception:
+                    # drop the message rather than the whole connection
+                    logger.exception(f"failed to encode server message: {msg}")
+                else:
+                    buffer.append(encoded)
+                    buffer_bytes += len(encoded)
+                if buffer_bytes >= max_chunk_bytes:
+                    break
+                try:
+                    msg = q_tx.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        msg = await asyncio.wait_for(q_tx.get(), remaining)
+                    except TimeoutError:
+                        break
+            if buffer:
+                text = encode_server_msgs(buffer)
+                logger.debug("sending WS message: %.500s...", text)
                 await websocket.send_text(text)
                 buffer.clear()
-                timeout = False
 
     async def recv_loop():
         while True:
             try:
                 msg_text = await websocket.receive_text()
-                logger.info(f"received WS message: {msg_text}")
+                logger.debug("received WS message: %.500s", msg_text)
                 msg = decode_client_msg(msg_text)
             except WebSocketDisconnect:
                 logger.info("websocket disconnected")
-                break
+                # ends the task group, and with it the other loops
+                raise
             except ValidationError:
                 logger.exception("failed to decode client message")
             except Exception:
@@ -511,14 +682,20 @@ async def websocket_endpoint(websocket: WebSocket):
             tg.create_task(send_init_data())
             tg.create_task(recv_loop())
             tg.create_task(handle_client_msg_loop())
-            tg.create_task(handle_state_changes_loop())
-            tg.create_task(send_loop(max_chunk_size=100, max_delay=0.1))
+            tg.create_task(send_loop(max_chunk_bytes=128 * 1024, max_delay=0.1))
+    except* WebSocketDisconnect:
+        pass
     except* Exception as e:
         logger.exception(f"WS connection {uid} exception in task group: {e.exceptions}")
         await websocket.close(1011)
     finally:
-        del qs_tx[uid]
-        del qs_rx[uid]
+        # nothing drains the send queue any more: a search blocked on it
+        # (or on queueing its MsgSearchComplete) would otherwise never end
+        q_tx.shutdown()
+        if state.search_task is not None:
+            state.search_task.cancel()
+            await asyncio.gather(state.search_task, return_exceptions=True)
+        await state.set_collection(None)
         logger.info(f"Closing WS connection {uid}")
 
 
@@ -527,7 +704,25 @@ async def lifespan(_):
     settings.home.mkdir(parents=True, exist_ok=True)
     setup_logger(settings.verbosity, settings.home)
     logger.info(f"Stereo settings: {settings}")
-    yield
+    default_collection_path = settings.home / "stereo.db"
+    # each new session looks at the default collection, keep its pool open
+    db.retain(default_collection_path)
+    try:
+        await db.init_db(db.Context(default_collection_path))
+        async with lib.create_session(settings.home / "http-cache.db") as http_session:
+            # reads back every cached response, so don't hold up startup for it
+            purge = asyncio.create_task(lib.delete_expired_responses(http_session))
+            try:
+                yield {
+                    "http_session": http_session,
+                    "default_collection_path": default_collection_path,
+                }
+            finally:
+                purge.cancel()
+                await asyncio.gather(purge, return_exceptions=True)
+    finally:
+        # aiosqlite's connection threads would otherwise keep the process alive
+        await db.close_all()
 
 
 routes: list = [
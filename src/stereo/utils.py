@@ -1,10 +1,32 @@
+import asyncio
 import os
+import time
 from pathlib import Path
 from typing import Literal
-from urllib.parse import urlparse
 
 import aiohttp
 
+# completions are requested on every keystroke, mostly within one directory,
+# so directory listings are kept for a short while
+_LISTING_TTL = 2.0  # seconds
+_listings: dict[Path, tuple[float, list[str]]] = {}
+
+
+def _list_dir(path: Path) -> list[str]:
+    now = time.monotonic()
+    cached = _listings.get(path)
+    if cached is not None and now - cached[0] < _LISTING_TTL:
+        return cached[1]
+    names = os.listdir(path)
+    if len(_listings) >= 32:
+        _listings.clear()
+    _listings[path] = (now, names)
+    return names
+
+
+def clear_path_completions_cache() -> None:
+    _listings.clear()
+
 
 def get_path_completions(prefix: str) -> list[str]:
     path_obj = Path(prefix).expanduser()  # handle ~
@@ -16,29 +38,43 @@ def get_path_completions(prefix: str) -> list[str]:
         parent = path_obj.parent
         partial_name = path_obj.name
 
-    if not parent.exists() or not parent.is_dir():
-        return []
-
     try:
-        return [str(p) for p in parent.iterdir() if p.name.startswith(partial_name)]
-    except PermissionError:
+        names = _list_dir(parent)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
         return []
 
+    return [str(parent / name) for name in names if name.startswith(partial_name)]
+
+
+async def get_path_completions_async(prefix: str) -> list[str]:
+    """`get_path_completions` in a worker thread, as listing a directory can
+    block for a while on network or cold file systems."""
+    return await asyncio.to_thread(get_path_completions, prefix)
 
-async def download_file(url: str, destination: Path) -> None:
+
+async def download_file(
+    url: str, destination: Path, connector: aiohttp.BaseConnector | None = None
+) -> None:
+    """Download `url` to `destination`.
+
+    Pass the `connector` of a long-lived session to reuse its connection pool
+    and DNS cache; the download itself bypasses that session's HTTP cache
+    and timeout.
+    """
     destination.parent.mkdir(parents=True, exist_ok=True)
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(
+        connector=connector, connector_owner=connector is None
+    ) as session:
         async with session.get(url) as response:
             response.raise_for_status()
             with open(destination, mode="wb") as f:
-                async for chunk in response.content.iter_chunked(1024):
-                    f.write(chunk)
+                # large reads, with the disk writes kept off the event loop
+                async for chunk in response.content.iter_chunked(1 << 16):
+                    await asyncio.to_thread(f.write, chunk)
 
 
 def is_file_or_url(path_or_url: str) -> Literal["file", "url"] | None:
-    parsed = urlparse(path_or_url)
-
-    if parsed.scheme in ("http", "https"):
+    if path_or_url[:8].lower().startswith(("http://", "https://")):
         return "url"
 
     if os.path.isabs(path_or_url):
@@ -0,0 +1,145 @@
+from datetime import date
+
+import pytest
+import pytest_asyncio
+
+import stereo.db as db
+from stereo.lib import Track
+from stereo.message import FilterModelItem, SortModelItem
+
+
+def make_tracks(n: int) -> list[Track]:
+    return [
+        Track(
+            yt_id=f"id{i}",
+            title=f"title {i}",
+            artists=[f"artist {i % 7}"],
+            release_date=date(2020, 1, 1 + i % 28),
+            bpm=100 + i % 40,
+        )
+        for i in range(n)
+    ]
+
+
+@pytest_asyncio.fixture
+async def ctx(tmp_path):
+    ctx = db.Context(tmp_path / "stereo.db")
+    await db.init_db(ctx)
+    yield ctx
+    await db.close_all()
+
+
+@pytest.mark.asyncio
+async def test_insert_and_get_track(ctx):
+    tracks = make_tracks(10)
+    await db.insert_tracks(ctx, tracks)
+    assert await db.count_rows(ctx, {}) == 10
+    assert await db.get_track(ctx, "id3") == tracks[3]
+    assert await db.get_track(ctx, "missing") is None
+
+
+@pytest.mark.asyncio
+async def test_delete_tracks(ctx):
+    await db.insert_tracks(ctx, make_tracks(10))
+    assert await db.delete_tracks(ctx, ["id1", "id2", "missing"]) == 2
+    assert await db.count_rows(ctx, {}) == 8
+    assert not await db.track_exists(ctx, "id1")
+    assert await db.track_exists(ctx, "id3")
+
+
+@pytest.mark.asyncio
+async def test_insert_tracks_spanning_batches(ctx):
+    tracks = make_tracks(1234)
+    assert await db.insert_tracks(ctx, tracks) == 1234
+    assert await db.count_rows(ctx, {}) == 1234
+    assert await db.get_track(ctx, "id1233") == tracks[1233]
+
+    updated = tracks[500].model_copy(update={"title": "updated"})
+    assert await db.insert_tracks(ctx, [updated], ignore_existing=True) == 0
+    assert (await db.get_track(ctx, "id500")).title == "title 500"
+    assert await db.count_rows(ctx, {}) == 1234
+    new = make_tracks(1236)[1234:]
+    assert await db.insert_tracks(ctx, [updated, *new], ignore_existing=False) == 2
+    assert (await db.get_track(ctx, "id500")).title == "updated"
+    assert await db.count_rows(ctx, {}) == 1236
+
+
+@pytest.mark.asyncio
+async def test_text_filter_tracks_writes(ctx):
+    await db.insert_tracks(ctx, make_tracks(30))
+
+    def contains(s):
+        return {"title": FilterModelItem("text", "contains", s)}
+
+    assert await db.count_rows(ctx, contains("TITLE 2")) == 11
+    assert await db.count_rows(ctx, contains("2")) == 12
+
+    renamed = await db.update_track(ctx, "id2", {"title": "renamed"})
+    assert renamed == (await db.get_track(ctx, "id2"))
+    assert renamed.title == "renamed"
+    assert await db.update_track(ctx, "missing", {"title": "x"}) is None
+    played = await db.increment_play_count(ctx, "id2")
+    assert (played.play_count, played.last_played) == (1, date.today())
+    assert played == (await db.get_track(ctx, "id2"))
+    assert await db.increment_play_count(ctx, "missing") is None
+    await db.insert_track(
+        ctx, Track(yt_id="id20", title="replaced", artists=["x"]), False
+    )
+    await db.delete_tracks(ctx, ["id21"])
+    assert await db.count_rows(ctx, contains("title 2")) == 8
+    assert await db.count_rows(ctx, contains("2")) == 9
+    assert await db.count_rows(ctx, contains("renamed")) == 1
+    assert await db.count_rows(ctx, contains("replaced")) == 1
+
+    rows = await db.get_rows(
+        ctx, 0, 5, [SortModelItem("bpm", "desc", None)], contains("title 2")
+    )
+    assert [t.bpm for t in rows] == sorted((t.bpm for t in rows), reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_count_during_open_write(ctx):
+    await db.insert_tracks(ctx, make_tracks(10))
+    row = tuple(Track(yt_id="new", title="new", artists=["x"]).to_db_row().values())
+    artist = {"artists": FilterModelItem("text", "contains", "x")}
+
+    async with ctx.writer() as conn:
+        await conn.execute(db._insert_rows_sql(False, 1), row)
+        # readers still see the snapshot from before the write
+        assert await db.count_rows(ctx, {}) == 10
+        assert await db.count_rows(ctx, artist) == 0
+
+    assert await db.count_rows(ctx, {}) == 11
+    assert await db.count_rows(ctx, artist) == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_closed_on_last_release(ctx):
+    db.retain(ctx.path)
+    db.retain(ctx.path)
+    pool = ctx.pool
+    await db.release(ctx.path)
+    assert ctx.pool is pool
+
+    async with ctx.reader() as conn:
+        await db.release(ctx.path)
+        assert ctx.path.absolute() not in db._pools
+        # a reader checked out at that point stays usable until returned
+        await conn.execute_fetchall("SELECT COUNT(*) FROM tracks")
+    assert pool._n_open_readers == 0
+    assert pool._readers.empty()
+
+
+@pytest.mark.asyncio
+async def test_counts_after_failed_bulk_insert(ctx):
+    titled = {"title": FilterModelItem("text", "contains", "title")}
+    assert await db.count_rows(ctx, titled) == 0
+
+    tracks = make_tracks(1500)
+    tracks[1200] = Track.model_construct(**{**dict(tracks[1200]), "title": None})
+    with pytest.raises(Exception):
+        await db.insert_tracks(ctx, tracks, ignore_existing=False)
+
+    # the first batch was committed before the second one failed
+    assert await db.count_rows(ctx, {}) == 1000
+    assert await db.count_rows(ctx, titled) == 1000